@@ -0,0 +1,194 @@
+import abc
+import asyncio
+import logging
+import os
+import sys
+
+import aiohttp
+
+from core_agent import job_executor_type_from_env
+from livekit.agents import JobExecutorType
+
+LEAD_SUBMIT_ATTEMPTS = 3
+
+
+class BackendUnavailableError(Exception):
+    """A transient failure talking to the backend; the call can be retried."""
+
+
+class BackendClient(abc.ABC):
+    """
+    How the agent talks to the cloud backend. The agent logic only uses
+    get_business_profile and create_lead; the transport is picked by
+    create_backend_client from the environment.
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        pass
+
+    @abc.abstractmethod
+    async def get_business_profile(self, business_id: str) -> dict:
+        ...
+
+    async def create_lead(self, payload: dict) -> bool:
+        """
+        Saves a lead, retrying transient failures with backoff.
+        The payload must carry an idempotency_key so retries never create duplicates.
+        """
+        for attempt in range(1, LEAD_SUBMIT_ATTEMPTS + 1):
+            try:
+                return await self._create_lead_once(payload)
+            except BackendUnavailableError as e:
+                logging.error(f"Failed to save lead (attempt {attempt}): {e}")
+            if attempt < LEAD_SUBMIT_ATTEMPTS:
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+        return False
+
+    @abc.abstractmethod
+    async def _create_lead_once(self, payload: dict) -> bool:
+        """Returns whether the lead is saved; raises BackendUnavailableError if worth retrying."""
+
+
+class HttpBackendClient(BackendClient):
+    def __init__(self, base_url: str, api_key: str, unix_socket: str | None = None):
+        """
+        Calls the backend's internal HTTP API. With `unix_socket`, requests go over
+        a Unix domain socket (e.g. `uvicorn main:app --uds /run/backend.sock`)
+        instead of TCP.
+        """
+        self._base_url = base_url
+        self._headers = {"Authorization": api_key}
+        connector = aiohttp.UnixConnector(path=unix_socket) if unix_socket else None
+        self._session = aiohttp.ClientSession(connector=connector)
+
+    async def aclose(self):
+        await self._session.close()
+
+    async def get_business_profile(self, business_id: str) -> dict:
+        url = f"{self._base_url}/api/internal/businesses/{business_id}"
+        async with self._session.get(url, headers=self._headers) as response:
+            if response.status != 200:
+                logging.error(f"Failed to fetch business profile: {response.status}")
+                raise Exception(f"Business not found: {business_id}")
+            return await response.json()
+
+    async def _create_lead_once(self, payload: dict) -> bool:
+        url = f"{self._base_url}/api/internal/leads"
+        try:
+            async with self._session.post(url, headers=self._headers, json=payload) as response:
+                # 201 means the lead was created, 200 that an earlier attempt already created it
+                if response.status in (200, 201):
+                    return True
+                body = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise BackendUnavailableError(f"Could not reach backend: {e}") from e
+        if response.status >= 500:
+            raise BackendUnavailableError(f"Status: {response.status}, Body: {body}")
+        logging.error(f"Backend rejected lead. Status: {response.status}, Body: {body}")
+        return False
+
+
+class DirectBackendClient(BackendClient):
+    def __init__(self, backend_dir: str):
+        """
+        Calls the backend's data-access functions in-process, over the backend's
+        own async engine, for deployments where the agent runs next to the
+        database. There is no HTTP hop, JSON encoding or API key check.
+        One client, and so one engine, serves every job of the process (see
+        create_backend_client); it needs the packages in requirements-direct.txt.
+        """
+        # Make the backend's `app` package importable, as its Alembic env.py does.
+        backend_dir = os.path.realpath(backend_dir)
+        if backend_dir not in sys.path:
+            sys.path.insert(0, backend_dir)
+        try:
+            from app import crud, db
+            from app.models import LeadCreate
+            from sqlalchemy import exc
+        except ImportError as e:
+            raise RuntimeError(
+                f"BACKEND_TRANSPORT=direct needs the backend's dependencies: "
+                f"pip install -r requirements-direct.txt ({e})"
+            ) from e
+
+        self._crud = crud
+        self._db = db
+        self._lead_model = LeadCreate
+        # Errors where the database, or the connection to it, failed rather than
+        # the lead: a retry may succeed. Anything else (an unknown business_id,
+        # a value too long) fails the same way every time.
+        self._transient_errors = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError, OSError)
+        self._db_errors = exc.DBAPIError
+
+    async def aclose(self):
+        # The engine outlives the job: it is shared with the process's later jobs.
+        pass
+
+    async def get_business_profile(self, business_id: str) -> dict:
+        async with self._db.read_session(business_id) as database:
+            db_business = await self._crud.get_business(database, business_id)
+        if db_business is None:
+            logging.error("Failed to fetch business profile: not found")
+            raise Exception(f"Business not found: {business_id}")
+        return dict(db_business._mapping)
+
+    async def _create_lead_once(self, payload: dict) -> bool:
+        try:
+            lead = self._lead_model.model_validate(payload)
+        except ValueError as e:
+            logging.error(f"Backend rejected lead: {e}")
+            return False
+        try:
+            async with self._db.write_session() as database:
+                db_lead, _ = await self._crud.create_lead(database, lead)
+        except self._transient_errors as e:
+            raise BackendUnavailableError(f"Database error: {e}") from e
+        except self._db_errors as e:
+            if e.connection_invalidated:
+                raise BackendUnavailableError(f"Database connection lost: {e}") from e
+            logging.error(f"Backend rejected lead: {e}")
+            return False
+        return db_lead is not None
+
+
+_direct_client: DirectBackendClient | None = None
+
+
+def create_backend_client() -> BackendClient:
+    """
+    Builds the backend client selected by BACKEND_TRANSPORT:
+    "http" (default) uses INTERNAL_API_URL, or INTERNAL_API_SOCKET when set;
+    "direct" imports the backend from BACKEND_DIR and uses its DATABASE_URL,
+    which must be Postgres.
+    The direct client is made once per process and returned to every job.
+    """
+    global _direct_client
+    transport = os.getenv("BACKEND_TRANSPORT", "http")
+    if transport == "direct":
+        # The backend's engine, connection pools and SQLite write lock are
+        # module-level and bound to one event loop, while the thread executor
+        # runs every job on a loop of its own.
+        if job_executor_type_from_env() == JobExecutorType.THREAD:
+            raise ValueError("BACKEND_TRANSPORT=direct cannot be used with AGENT_EXECUTOR=thread, use 'http'.")
+        if _direct_client is None:
+            backend_dir = os.getenv("BACKEND_DIR", os.path.join(os.path.dirname(__file__), "..", "backend"))
+            client = DirectBackendClient(backend_dir)
+            # On SQLite, lead events go only to the subscribers of the process that
+            # inserted the lead: the backend's event streams would never see the agent's leads.
+            if client._db.IS_SQLITE:
+                raise ValueError("BACKEND_TRANSPORT=direct cannot be used with an SQLite DATABASE_URL, use 'http'.")
+            _direct_client = client
+        return _direct_client
+    if transport != "http":
+        raise ValueError(f"Unknown BACKEND_TRANSPORT '{transport}', expected 'http' or 'direct'.")
+
+    unix_socket = os.getenv("INTERNAL_API_SOCKET")
+    # Over a Unix socket the host part of the URL is ignored, but aiohttp still needs one.
+    base_url = "http://backend" if unix_socket else os.getenv("INTERNAL_API_URL")
+    return HttpBackendClient(base_url, os.getenv("INTERNAL_API_KEY"), unix_socket)
@@ -0,0 +1,226 @@
+"""
+Memory, CPU and turn latency per agent session: one process per job
+(AGENT_EXECUTOR=process) against many job threads per process
+(AGENT_EXECUTOR=thread), as the number of concurrent sessions grows.
+
+Each simulated session runs the audio work a call does on the worker: a
+Silero VAD stream fed 10 ms frames of 48 kHz audio in real time (speech-like
+bursts and pauses). STT, LLM and TTS run remotely and cost the same in both
+modes, so they are left out. The model is loaded as prewarm loads it:
+  * "process": one process per session, started the way the LiveKit worker
+    starts job processes, each loading its own VAD model,
+  * "thread": one process hosting every session on a thread of its own, each
+    with its own event loop as the thread executor does, all sharing the
+    model loaded through core_agent.shared_silero_vad.
+For each mode and number of sessions it reports:
+  * memory per session: the peak proportional set size (PSS) of all the
+    processes involved, summed, divided by the number of sessions,
+  * CPU per session: CPU time used while the sessions ran, in % of one core,
+  * turn latency: how far behind the audio the VAD is when it finishes a
+    window (p50/p95/p99), which is added to detecting the end of every turn.
+
+Run from apps/cloud/agent:
+    python -m benchmarks.session_footprint --sessions 1,4,16,32 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+import psutil
+from livekit import rtc
+from livekit.agents import vad as agents_vad
+from livekit.plugins import silero
+
+from core_agent import shared_silero_vad
+
+MODES = ("process", "thread")
+SAMPLE_RATE = 48000
+FRAME_MS = 10
+MB = 1024 * 1024
+
+
+def speech_like_audio(seconds: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Voiced bursts (harmonics of a 140 Hz pitch, 1.5 s on, 0.8 s off) over low background noise."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voiced = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 8))
+    envelope = (t % 2.3) < 1.5
+    signal = 0.3 * voiced * envelope + 0.01 * np.random.default_rng(0).standard_normal(t.size)
+    return (signal / np.abs(signal).max() * 0.5 * 32767).astype(np.int16)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_session(vad: silero.VAD, audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> list[float]:
+    """Feeds `audio` to a VAD stream in real time; returns how late each window finished, in seconds."""
+    stream = vad.stream()
+    frame_samples = sample_rate * FRAME_MS // 1000
+    started = time.perf_counter()
+
+    async def feed():
+        for index, offset in enumerate(range(0, len(audio) - frame_samples + 1, frame_samples)):
+            # A frame arrives once its 10 ms have been captured, on a fixed
+            # schedule however far behind the VAD is.
+            await asyncio.sleep(max(0.0, started + (index + 1) * FRAME_MS / 1000 - time.perf_counter()))
+            frame = audio[offset:offset + frame_samples]
+            stream.push_frame(rtc.AudioFrame(frame.tobytes(), sample_rate, 1, frame_samples))
+        stream.end_input()
+
+    feeder = asyncio.create_task(feed())
+    lags = []
+    async for event in stream:
+        if event.type == agents_vad.VADEventType.INFERENCE_DONE:
+            # The window's last sample was pushed at `started + event.timestamp`.
+            lags.append(time.perf_counter() - started - event.timestamp)
+    await feeder
+    await stream.aclose()
+    return lags
+
+
+def _cpu_seconds(process: psutil.Process) -> float:
+    times = process.cpu_times()
+    return times.user + times.system
+
+
+def _process_job(audio: np.ndarray, ready, start, results):
+    """One session per process: prewarm, then the session."""
+    vad = silero.VAD.load()
+    ready.put(os.getpid())
+    start.wait()
+    process = psutil.Process()
+    cpu_start = _cpu_seconds(process)
+    lags = asyncio.run(run_session(vad, audio))
+    results.put({"lags": lags, "cpu_seconds": _cpu_seconds(process) - cpu_start})
+
+
+def _thread_host(sessions: int, audio: np.ndarray, ready, start, results):
+    """Every session on a thread of this process, sharing the model."""
+    shared_silero_vad()
+    ready.put(os.getpid())
+    start.wait()
+    process = psutil.Process()
+    cpu_start = _cpu_seconds(process)
+    session_lags: list[list[float]] = [[] for _ in range(sessions)]
+
+    def job(index: int):
+        # What prewarm does for each job thread; the model is already loaded.
+        vad = shared_silero_vad()
+        session_lags[index] = asyncio.run(run_session(vad, audio))
+
+    threads = [threading.Thread(target=job, args=(index,), name=f"job-{index}") for index in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put({
+        "lags": [lag for lags in session_lags for lag in lags],
+        "cpu_seconds": _cpu_seconds(process) - cpu_start,
+    })
+
+
+def _pss(pid: int) -> int:
+    try:
+        info = psutil.Process(pid).memory_full_info()
+    except psutil.NoSuchProcess:
+        return 0
+    # PSS splits shared pages between the processes mapping them; it is Linux only.
+    return getattr(info, "pss", info.rss)
+
+
+def run(mode: str, sessions: int, duration: float, mp_context) -> dict:
+    audio = speech_like_audio(duration)
+    ready, results, start = mp_context.Queue(), mp_context.Queue(), mp_context.Event()
+    if mode == "process":
+        processes = [mp_context.Process(target=_process_job, args=(audio, ready, start, results)) for _ in range(sessions)]
+    else:
+        processes = [mp_context.Process(target=_thread_host, args=(sessions, audio, ready, start, results))]
+    for process in processes:
+        process.start()
+    pids = [ready.get() for _ in processes]
+
+    start.set()
+    started = time.perf_counter()
+    reports, peak_pss = [], 0
+    while len(reports) < len(processes):
+        peak_pss = max(peak_pss, sum(_pss(pid) for pid in pids))
+        try:
+            reports.append(results.get(timeout=0.5))
+        except queue.Empty:
+            if any(process.exitcode not in (None, 0) for process in processes):
+                raise RuntimeError(f"A {mode} session process failed")
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    lags = sorted(lag for report in reports for lag in report["lags"])
+    cpu_seconds = sum(report["cpu_seconds"] for report in reports)
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "processes": len(processes),
+        "memory_mb": round(peak_pss / MB, 1),
+        "memory_mb_per_session": round(peak_pss / MB / sessions, 1),
+        "cpu_percent_per_session": round(100 * cpu_seconds / elapsed / sessions, 1),
+        "lag_p50_ms": round(1000 * percentile(lags, 0.50), 1),
+        "lag_p95_ms": round(1000 * percentile(lags, 0.95), 1),
+        "lag_p99_ms": round(1000 * percentile(lags, 0.99), 1),
+    }
+
+
+def print_report(rows: list[dict]):
+    print(
+        f"{'mode':<8} {'sessions':>8} {'procs':>6} {'total MB':>9} {'MB/sess':>8} "
+        f"{'CPU%/sess':>10} {'lag p50':>8} {'lag p95':>8} {'lag p99':>8}"
+    )
+    for row in rows:
+        print(
+            f"{row['mode']:<8} {row['sessions']:>8} {row['processes']:>6} {row['memory_mb']:>9.1f} "
+            f"{row['memory_mb_per_session']:>8.1f} {row['cpu_percent_per_session']:>10.1f} "
+            f"{row['lag_p50_ms']:>8.1f} {row['lag_p95_ms']:>8.1f} {row['lag_p99_ms']:>8.1f}"
+        )
+
+
+def main(args):
+    # The LiveKit worker starts job processes from a forkserver on Linux, with the plugins preloaded.
+    if sys.platform.startswith("linux"):
+        mp_context = multiprocessing.get_context("forkserver")
+        mp_context.set_forkserver_preload(["livekit.agents", "livekit.plugins.silero"])
+    else:
+        mp_context = multiprocessing.get_context("spawn")
+
+    rows = []
+    for sessions in args.sessions:
+        for mode in args.modes:
+            rows.append(run(mode, sessions, args.duration, mp_context))
+    print_report(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Saved results to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--sessions", type=lambda value: [int(n) for n in value.split(",")], default=[1, 4, 16],
+        help="Comma-separated numbers of concurrent sessions to run.",
+    )
+    parser.add_argument(
+        "--modes", type=lambda value: value.split(","), default=list(MODES),
+        help="Comma-separated modes to run: process, thread or both.",
+    )
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of audio per session.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    main(parser.parse_args())
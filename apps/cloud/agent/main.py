@@ -1,11 +1,13 @@
 import asyncio
 import logging
 import os
-import aiohttp
+import hashlib
 import json
 
 
-from core_agent import BusinessAgent
+from core_agent import logs, BusinessAgent, FAQAnswerCache, GreetingTimer, JobMemoryProfiler, LLMRouter, LowPowerMode, TaskRejectedError, TaskSupervisor
+from core_agent import job_executor_type_from_env, process_shared, shared_silero_vad
+from backend_client import create_backend_client
 from string import Template
 from dotenv import load_dotenv
 
@@ -16,31 +18,47 @@ from livekit import agents
 # This is the corrected import path for the event and state enum
 from livekit.agents import JobRequest, function_tool, get_job_context, UserStateChangedEvent
 from livekit import rtc
-from livekit.plugins import deepgram, groq, silero, cartesia
+from livekit.plugins import deepgram, groq, cartesia
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Configure logging: records are written by a background thread, never on the event loop
+logs.setup_logging()
 
 # Debug environment variables
 LIVEKIT_URL = os.getenv("LIVEKIT_URL")
 logging.info(f"LIVEKIT_URL from environment: {LIVEKIT_URL}")
 
-INTERNAL_API_URL = os.getenv("INTERNAL_API_URL")
-INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
-
-
-async def fetch_business_profile(session: aiohttp.ClientSession, business_id: str) -> dict:
-    url = f"{INTERNAL_API_URL}/api/internal/businesses/{business_id}"
-    headers = {"Authorization": INTERNAL_API_KEY}
-    async with session.get(url, headers=headers) as response:
-        if response.status != 200:
-            logging.error(f"Failed to fetch business profile: {response.status}")
-            raise Exception(f"Business not found: {business_id}")
-        return await response.json()
+# Background work (lead submissions) allowed at once, and held at most, per session and per worker process
+SESSION_TASK_CONCURRENCY = 1
+SESSION_MAX_PENDING_TASKS = 4
+WORKER_TASK_CONCURRENCY = 8
+WORKER_MAX_PENDING_TASKS = 32
+# How long submissions still in progress may run once the session ends
+TASK_SHUTDOWN_TIMEOUT = 10.0
+# How long to wait for the visitor's audio before giving up. An early-dispatched agent
+# joins as the token is minted, before the page has even asked for the microphone.
+GREETING_WAIT_TIMEOUT = 20.0
+EARLY_DISPATCH_GREETING_WAIT_TIMEOUT = 60.0
+
+def lead_idempotency_key(room_name: str, payload: dict) -> str:
+    """
+    Derives a stable idempotency key from the session (room) and the lead payload,
+    so every retry of the same submission is recognized by the backend as a duplicate.
+    """
+    payload_hash = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    return f"{room_name}:{payload_hash}"
 
 async def entrypoint(ctx: agents.JobContext):
     logging.info(f"Agent received job: {ctx.job.id} for room {ctx.room.name}")
+    # One monitor per job process: reports how long the event loop running the audio pipeline gets blocked.
+    if "loop_lag" not in ctx.proc.userdata:
+        ctx.proc.userdata["loop_lag"] = logs.EventLoopLagMonitor()
+        ctx.proc.userdata["loop_lag"].start()
+    # Reports this job's memory high-water mark when it ends (and, with
+    # MEMORY_PROFILING=true, what the previous job left behind).
+    ctx.proc.userdata["memory"].start_job(ctx.job.id)
+    ctx.add_shutdown_callback(ctx.proc.userdata["memory"].end_job)
     
+    greeting_timer = GreetingTimer(ctx.job.room.metadata)
     session_ended = asyncio.Event()
     greeting_allowed = asyncio.Event()
 
@@ -50,6 +68,7 @@ async def entrypoint(ctx: agents.JobContext):
         # Once we have subscribed to the user's audio track, we can greet them
         if track.kind == rtc.TrackKind.KIND_AUDIO and not participant.identity.startswith("contractor-leads-bot-agent"):
             logging.info("AGENT: User audio track subscribed. Allowing greeting.")
+            greeting_timer.mark("visitor_audio")
             greeting_allowed.set()
 
     @ctx.room.on("participant_disconnected")
@@ -57,19 +76,21 @@ async def entrypoint(ctx: agents.JobContext):
         logging.info(f"Participant disconnected: {participant.identity}, closing session.")
         session_ended.set()
 
-    async with aiohttp.ClientSession() as http_session:
+    async with create_backend_client() as backend:
         try:
             # The room name is now "contractor_id-conversation_id".
             # We need to extract just the contractor_id part.
             # This splits the string by '-' and rejoins all but the last part.
             # The room name is now "contractor_id_conversation_id".
             # We can reliably split by the first underscore.
-            business_id = ctx.room.name.split('_')[0]
-            profile = await fetch_business_profile(http_session, business_id)
+            # Rooms created at token-mint time (early dispatch) also carry it in their metadata.
+            business_id = greeting_timer.business_id or ctx.room.name.split('_')[0]
+            profile = await backend.get_business_profile(business_id)
 
             # Now, connect to the room
             await ctx.connect()
             logging.info("Agent connected to the room.")
+            greeting_timer.room_created(ctx.room.creation_time)
 
         except Exception as e:
             logging.error(f"Could not start agent session during setup: {e}")
@@ -94,8 +115,14 @@ async def entrypoint(ctx: agents.JobContext):
             f"Business Information: {profile['knowledge_base']}"
         )
 
-                        stt = deepgram.STT()
+        stt = deepgram.STT()
         llm = groq.LLM(model="llama-3.3-70b-versatile")
+        # Simple turns go to a small, faster model; the large one handles the rest.
+        llm_router = LLMRouter(
+            small=groq.LLM(model=os.getenv("LLM_SMALL_MODEL", "llama-3.1-8b-instant")),
+            large=llm,
+            decision_log=logs.file_logger("llm_routing", os.environ["LLM_ROUTING_LOG"]) if os.getenv("LLM_ROUTING_LOG") else None,
+        )
         
         # Use the pre-warmed clients and models from userdata
         tts = ctx.proc.userdata["tts"]
@@ -111,12 +138,24 @@ async def entrypoint(ctx: agents.JobContext):
         )
         
         # Initialize our shared BusinessAgent with the instructions we just built
-        agent = BusinessAgent(instructions=instructions)
+        # Answers cached for this business are only reused while its profile is unchanged.
+        profile_version = hashlib.sha256(json.dumps(profile, sort_keys=True, default=str).encode()).hexdigest()
+        answer_cache = ctx.proc.userdata["answer_cache"].scope(business_id, profile_version)
+        agent = BusinessAgent(instructions=instructions, llm_router=llm_router, answer_cache=answer_cache)
+        low_power = LowPowerMode(session, ctx.room)
+        tasks = TaskSupervisor(
+            f"session {ctx.room.name}",
+            max_concurrency=SESSION_TASK_CONCURRENCY,
+            max_pending=SESSION_MAX_PENDING_TASKS,
+            parent=ctx.proc.userdata["tasks"],
+        )
 
         @session.on("user_state_changed")
         def on_user_state_changed(ev: UserStateChangedEvent):
             if ev.new_state == "away" and agent._is_form_displayed:
                 logging.info("User is viewing the form, ignoring away state to prevent session timeout.")
+                # Nobody is talking while the form is filled in, so stop paying for STT and VAD.
+                low_power.enter("user is viewing the form")
                 return
             if ev.new_state == "away":
                 logging.info("User is away and no form is displayed, closing session.")
@@ -130,16 +169,16 @@ async def entrypoint(ctx: agents.JobContext):
             """
             # 1. Immediately interrupt any ongoing speech for a responsive feel.
             session.interrupt()
-            logging.info(f"Agent received submit_lead_form RPC with payload: {data.payload}")
+            low_power.exit("lead form submitted")
+            logging.info("Agent received submit_lead_form RPC with payload: %s", data.payload, extra=logs.SAMPLED)
 
             async def _process_submission():
                 """Inner function to handle the actual logic in the background."""
                 try:
                     agent._is_form_displayed = False
                     frontend_data = json.loads(data.payload)
-                    
-                    business_id = ctx.room.name.split('_')[0]
 
+                    # The business whose profile this session uses (see above).
                     backend_payload = {
                         "business_id": business_id,
                         "visitor_name": frontend_data.get("name"),
@@ -147,24 +186,25 @@ async def entrypoint(ctx: agents.JobContext):
                         "visitor_email": frontend_data.get("email"),
                         "visitor_phone": frontend_data.get("phone"),
                     }
-                    url = f"{INTERNAL_API_URL}/api/internal/leads"
-                    headers = {"Authorization": INTERNAL_API_KEY}
-                    async with http_session.post(url, headers=headers, json=backend_payload) as response:
-                        if response.status == 201:
-                            logging.info("Successfully saved lead to the database.")
-                            await session.say(
-                                "Thank you. Your information has been sent. Was there anything else I can help you with today?",
-                                allow_interruptions=True
-                            )
-                        else:
-                            logging.error(f"Failed to save lead. Status: {response.status}, Body: {await response.text()}")
-                            await session.say("I'm sorry, there was an error saving your information. Please try again in a moment.")
+                    backend_payload["idempotency_key"] = lead_idempotency_key(ctx.room.name, backend_payload)
+                    if await backend.create_lead(backend_payload):
+                        logging.info("Successfully saved lead to the database.")
+                        await session.say(
+                            "Thank you. Your information has been sent. Was there anything else I can help you with today?",
+                            allow_interruptions=True
+                        )
+                    else:
+                        await session.say("I'm sorry, there was an error saving your information. Please try again in a moment.")
                 except Exception as e:
                     logging.error(f"Error processing submit_lead_form RPC in background: {e}")
                     await session.say("I'm sorry, a technical error occurred. Please try again.")
 
-            # 2. Start the submission processing in the background.
-            asyncio.create_task(_process_submission())
+            # 2. Start the submission processing in the background, unless too many are already in progress.
+            try:
+                tasks.submit(_process_submission, "submit_lead_form")
+            except TaskRejectedError as e:
+                logging.warning(f"Rejecting submit_lead_form RPC: {e}")
+                raise rtc.RpcError(rtc.RpcError.ErrorCode.APPLICATION_ERROR, "Too many submissions in progress. Please try again.")
 
             # 3. Immediately return a success message to the frontend to prevent timeout.
             return "SUCCESS"
@@ -172,6 +212,7 @@ async def entrypoint(ctx: agents.JobContext):
         logging.info("AGENT: Attempting to start AgentSession...")
         await session.start(room=ctx.room, agent=agent)
         logging.info("AGENT: AgentSession started.")
+        greeting_timer.mark("agent_ready")
 
         ctx.room.local_participant.register_rpc_method(
             "submit_lead_form", submit_lead_form_handler
@@ -179,15 +220,23 @@ async def entrypoint(ctx: agents.JobContext):
 
         try:
             logging.info("AGENT: Waiting for a user to connect with an audio track...")
-            await asyncio.wait_for(greeting_allowed.wait(), timeout=20.0)
+            timeout = EARLY_DISPATCH_GREETING_WAIT_TIMEOUT if greeting_timer.early_dispatch else GREETING_WAIT_TIMEOUT
+            await asyncio.wait_for(greeting_allowed.wait(), timeout=timeout)
             logging.info("AGENT: Greeting is allowed. Attempting to say initial greeting...")
+            greeting_timer.mark("greeting")
             await session.say(f"Thank you for calling {profile['business_name']}. How can I help you today?", allow_interruptions=True)
             logging.info("AGENT: Finished saying initial greeting.")
         except asyncio.TimeoutError:
             logging.warning("AGENT: Timed out waiting for user audio track. Not sending greeting.")
             session_ended.set()
+        greeting_timer.report()
 
         await session_ended.wait()
+        low_power.close()
+        # Let submissions in progress finish (they may still speak) before closing the session.
+        await tasks.aclose(timeout=TASK_SHUTDOWN_TIMEOUT)
+        logging.info(f"Background tasks for this session: {tasks.metrics()}, worker: {ctx.proc.userdata['tasks'].metrics()}")
+        logging.info(f"LLM routing for this session: {llm_router.summary()}")
         await session.aclose()
 
     ctx.shutdown()
@@ -202,9 +251,28 @@ def prewarm(proc: agents.JobProcess):
     # We load environment variables and initialize our stable clients and models here.
     load_dotenv()
     logging.info("Prewarm: Environment variables loaded into child process.")
+
+    # The direct backend transport's client, and its engine, serve every job of
+    # this process; made here so the first call does not pay for it.
+    if os.getenv("BACKEND_TRANSPORT", "http") == "direct":
+        create_backend_client()
     
-    proc.userdata["vad"] = silero.VAD.load()
+    # With AGENT_EXECUTOR=thread, prewarm runs for every job thread: the VAD
+    # model and the answer cache are loaded once per process and shared, while
+    # the TTS client and the task supervisor belong to the job's event loop.
+    proc.userdata["vad"] = shared_silero_vad()
     proc.userdata["tts"] = cartesia.TTS(model="sonic-english")
+    # Per-job memory accounting; tracemalloc only runs with MEMORY_PROFILING=true.
+    # With the thread executor its figures cover every job in the process.
+    proc.userdata["memory"] = JobMemoryProfiler()
+
+    # Bounds the background work of all sessions this process (or job thread) runs.
+    proc.userdata["tasks"] = TaskSupervisor("worker", max_concurrency=WORKER_TASK_CONCURRENCY, max_pending=WORKER_MAX_PENDING_TASKS)
+
+    # Shared by every session this process runs, so repeat questions skip the LLM.
+    proc.userdata["answer_cache"] = process_shared(
+        "answer_cache", lambda: FAQAnswerCache(ttl=float(os.getenv("FAQ_CACHE_TTL_SECONDS", "3600")))
+    )
     logging.info("Prewarm complete for cloud agent: VAD model and TTS client initialized.")
 # ^-- THIS ENTIRE FUNCTION IS NEW --^
 
@@ -215,6 +283,10 @@ if __name__ == "__main__":
     agents.WorkerOptions(
         request_fnc=request_fnc,
         entrypoint_fnc=entrypoint,
-        prewarm_fnc=prewarm  # <-- THIS LINE IS ADDED
+        prewarm_fnc=prewarm,  # <-- THIS LINE IS ADDED
+        # AGENT_EXECUTOR=thread hosts many sessions per process (see core_agent.job_executor)
+        job_executor_type=job_executor_type_from_env(),
+        # With a name, the worker only takes explicitly dispatched jobs (see EARLY_AGENT_DISPATCH)
+        agent_name=os.getenv("AGENT_NAME", ""),
     )
 )
\ No newline at end of file
@@ -52,6 +52,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
     )
 
     with context.begin_transaction():
@@ -73,7 +74,13 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite can only ALTER tables by copying them, which batch mode does for us.
+            render_as_batch=connection.dialect.name == "sqlite",
+            # One transaction per revision, so the online helpers in
+            # app/online_migrations.py only commit the revision they run in.
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,31 @@
+"""Add idempotency key to leads
+
+Revision ID: 3f9c2b71e4a8
+Revises: d7aa47ee743c
+Create Date: 2026-10-19 09:12:44.310527
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2b71e4a8'
+down_revision: Union[str, Sequence[str], None] = 'd7aa47ee743c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('leads', sa.Column('idempotency_key', sa.String(length=255), nullable=True))
+    # Existing rows keep a NULL key, and NULLs never conflict with each other.
+    op.create_index('ix_leads_idempotency_key', 'leads', ['idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_leads_idempotency_key', table_name='leads')
+    op.drop_column('leads', 'idempotency_key')
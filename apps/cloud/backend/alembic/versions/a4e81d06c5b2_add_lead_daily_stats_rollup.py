@@ -0,0 +1,46 @@
+"""Add lead daily stats rollup
+
+Revision ID: a4e81d06c5b2
+Revises: 3f9c2b71e4a8
+Create Date: 2026-10-19 11:03:27.845190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e81d06c5b2'
+down_revision: Union[str, Sequence[str], None] = '3f9c2b71e4a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('lead_daily_stats',
+    sa.Column('business_id', sa.String(length=255), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('lead_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['business_id'], ['businesses.id'], ),
+    sa.PrimaryKeyConstraint('business_id', 'day', 'status')
+    )
+
+    # Seed the rollup from the leads captured so far; from here on the API keeps it current.
+    op.execute(
+        """
+        INSERT INTO lead_daily_stats (business_id, day, status, lead_count)
+        SELECT business_id, captured_at::date, COALESCE(status, 'new'), COUNT(*)
+        FROM leads
+        WHERE captured_at IS NOT NULL
+        GROUP BY business_id, captured_at::date, COALESCE(status, 'new')
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('lead_daily_stats')
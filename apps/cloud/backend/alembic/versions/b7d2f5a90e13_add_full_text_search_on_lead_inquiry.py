@@ -0,0 +1,42 @@
+"""Add full-text search on lead inquiry
+
+Revision ID: b7d2f5a90e13
+Revises: a4e81d06c5b2
+Create Date: 2026-10-19 13:41:02.518830
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app import online_migrations
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2f5a90e13'
+down_revision: Union[str, Sequence[str], None] = 'a4e81d06c5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The search vector is indexed as an expression rather than stored in a
+# generated column: adding a stored column rewrites all of leads under an
+# exclusive lock, while the index is built concurrently.
+INQUIRY_TSV = "to_tsvector('english', coalesce(inquiry, ''))"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        # Full-text search is Postgres only.
+        return
+    online_migrations.create_index_concurrently(
+        'ix_leads_inquiry_tsv', 'leads', [sa.text(INQUIRY_TSV)], postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    online_migrations.drop_index_concurrently('ix_leads_inquiry_tsv', 'leads')
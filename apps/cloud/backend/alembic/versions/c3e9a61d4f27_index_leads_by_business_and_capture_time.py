@@ -0,0 +1,33 @@
+"""Index leads by business and capture time
+
+Revision ID: c3e9a61d4f27
+Revises: b7d2f5a90e13
+Create Date: 2026-10-19 16:22:09.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app import online_migrations
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e9a61d4f27'
+down_revision: Union[str, Sequence[str], None] = 'b7d2f5a90e13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built concurrently, so lead capture carries on while the index is built.
+    online_migrations.create_index_concurrently(
+        'ix_leads_business_id_captured_at', 'leads', ['business_id', 'captured_at']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    online_migrations.drop_index_concurrently('ix_leads_business_id_captured_at', 'leads')
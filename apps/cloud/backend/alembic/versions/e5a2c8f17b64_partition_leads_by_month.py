@@ -0,0 +1,154 @@
+"""Partition leads by month
+
+Revision ID: e5a2c8f17b64
+Revises: c3e9a61d4f27
+Create Date: 2026-10-19 18:05:41.227913
+
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app import online_migrations, partitions
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a2c8f17b64'
+down_revision: Union[str, Sequence[str], None] = 'c3e9a61d4f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Indexes of the current table that get new names as it becomes leads_legacy,
+# since the partitioned leads table takes over the originals.
+LEGACY_INDEXES = {
+    'ix_leads_idempotency_key': 'ix_leads_legacy_idempotency_key',
+    'ix_leads_inquiry_tsv': 'ix_leads_legacy_inquiry_tsv',
+    'ix_leads_business_id_captured_at': 'ix_leads_legacy_business_id_captured_at',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The current table is not copied: it becomes the leads_legacy partition,
+    # holding every lead captured before `boundary`, and monthly partitions
+    # start there. Using the month after next keeps new leads within the
+    # legacy bound even if this migration runs across the end of a month.
+    boundary = partitions.add_months(partitions.month_start(datetime.datetime.utcnow().date()), 2)
+
+    # The partition key must be NOT NULL. Leads without a capture time are
+    # dated to the epoch, so they age out with the oldest leads.
+    online_migrations.backfill_in_batches(
+        'leads_captured_at', 'leads', "captured_at = TIMESTAMP '1970-01-01'", 'captured_at IS NULL'
+    )
+    online_migrations.add_check_constraint_not_valid('ck_leads_captured_at_not_null', 'leads', 'captured_at IS NOT NULL')
+    online_migrations.validate_constraint('leads', 'ck_leads_captured_at_not_null')
+    # With a validated constraint proving every row fits the legacy bound,
+    # attaching the table as a partition does not scan it.
+    online_migrations.add_check_constraint_not_valid(
+        'ck_leads_legacy_bound', 'leads', f"captured_at < '{boundary.isoformat()}'"
+    )
+    online_migrations.validate_constraint('leads', 'ck_leads_legacy_bound')
+    # The partitioned table's primary key must include the partition key.
+    online_migrations.create_index_concurrently('ix_leads_legacy_id_captured_at', 'leads', ['id', 'captured_at'], unique=True)
+
+    # Unique indexes on a partitioned table must include captured_at, so
+    # idempotency keys get a table of their own. Copied outside the migration
+    # transaction; keys of leads inserted meanwhile are copied during the swap.
+    # Leads that took an id up to `copied_through` are all committed (or rolled
+    # back) before the copy starts, so the swap only has to copy later ids.
+    copied_through = None
+    with op.get_context().autocommit_block():
+        if not op.get_context().as_sql:
+            copied_through = op.get_bind().execute(sa.text("SELECT last_value FROM leads_id_seq")).scalar()
+            online_migrations.wait_for_older_transactions()
+        op.create_table('lead_idempotency_keys',
+        sa.Column('idempotency_key', sa.String(length=255), nullable=False),
+        sa.Column('lead_id', sa.Integer(), nullable=False),
+        sa.Column('captured_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('idempotency_key'),
+        if_not_exists=True
+        )
+        op.execute(
+            """
+            INSERT INTO lead_idempotency_keys (idempotency_key, lead_id, captured_at)
+            SELECT idempotency_key, id, captured_at FROM leads WHERE idempotency_key IS NOT NULL
+            ON CONFLICT (idempotency_key) DO NOTHING
+            """
+        )
+
+    # The swap itself only changes the catalog, under a short lock_timeout.
+    with online_migrations.lock_timeout():
+        # No scan: the validated constraint already proves it.
+        op.execute("ALTER TABLE leads ALTER COLUMN captured_at SET NOT NULL")
+        op.drop_constraint('ck_leads_captured_at_not_null', 'leads', type_='check')
+        op.rename_table('leads', 'leads_legacy')
+        # Switch to a primary key that includes captured_at, backed by the index
+        # built above, so the partitioned table's primary key can adopt it.
+        op.execute(
+            "ALTER TABLE leads_legacy DROP CONSTRAINT leads_pkey, "
+            "ADD CONSTRAINT leads_legacy_pkey PRIMARY KEY USING INDEX ix_leads_legacy_id_captured_at"
+        )
+        for name, legacy_name in LEGACY_INDEXES.items():
+            op.execute(f"ALTER INDEX {name} RENAME TO {legacy_name}")
+
+        op.execute(
+            "CREATE TABLE leads (LIKE leads_legacy INCLUDING DEFAULTS INCLUDING GENERATED) "
+            "PARTITION BY RANGE (captured_at)"
+        )
+        op.execute("ALTER SEQUENCE leads_id_seq OWNED BY leads.id")
+        op.create_primary_key('leads_pkey', 'leads', ['id', 'captured_at'])
+        op.create_foreign_key('leads_business_id_fkey', 'leads', 'businesses', ['business_id'], ['id'])
+        op.create_index('ix_leads_business_id_captured_at', 'leads', ['business_id', 'captured_at'], unique=False)
+        op.create_index(
+            'ix_leads_inquiry_tsv', 'leads', [sa.text("to_tsvector('english', coalesce(inquiry, ''))")],
+            unique=False, postgresql_using='gin'
+        )
+
+        # Reuses the legacy table's matching indexes and foreign key.
+        op.execute(
+            f"ALTER TABLE leads ATTACH PARTITION {partitions.LEGACY_PARTITION} "
+            f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+        )
+        op.drop_constraint('ck_leads_legacy_bound', partitions.LEGACY_PARTITION, type_='check')
+        for months in range(partitions.LEAD_PARTITIONS_AHEAD + 1):
+            op.execute(partitions.create_partition_sql(partitions.add_months(boundary, months)))
+
+        # Offline (--sql) mode cannot read the sequence, so it copies every key again.
+        copy_from = "" if copied_through is None else f"AND id > {int(copied_through)}"
+        op.execute(
+            f"""
+            INSERT INTO lead_idempotency_keys (idempotency_key, lead_id, captured_at)
+            SELECT idempotency_key, id, captured_at FROM leads_legacy
+            WHERE idempotency_key IS NOT NULL {copy_from}
+            ON CONFLICT (idempotency_key) DO NOTHING
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Folds the leads of the monthly partitions back into leads_legacy and
+    # makes it the plain leads table again. This copies rows and locks the
+    # table while doing so. Partitions already detached by the retention
+    # policy are left alone.
+    op.execute(f"ALTER TABLE leads DETACH PARTITION {partitions.LEGACY_PARTITION}")
+    op.execute(
+        f"""
+        INSERT INTO {partitions.LEGACY_PARTITION}
+            (id, business_id, visitor_name, visitor_phone, visitor_email, inquiry, status, captured_at, idempotency_key)
+        SELECT id, business_id, visitor_name, visitor_phone, visitor_email, inquiry, status, captured_at, idempotency_key
+        FROM leads
+        """
+    )
+    op.execute(f"ALTER SEQUENCE leads_id_seq OWNED BY {partitions.LEGACY_PARTITION}.id")
+    op.drop_table('leads')
+    op.drop_table('lead_idempotency_keys')
+
+    op.rename_table(partitions.LEGACY_PARTITION, 'leads')
+    op.drop_constraint('leads_legacy_pkey', 'leads', type_='primary')
+    op.create_primary_key('leads_pkey', 'leads', ['id'])
+    for name, legacy_name in LEGACY_INDEXES.items():
+        op.execute(f"ALTER INDEX {legacy_name} RENAME TO {name}")
+    op.execute("ALTER TABLE leads ALTER COLUMN captured_at DROP NOT NULL")
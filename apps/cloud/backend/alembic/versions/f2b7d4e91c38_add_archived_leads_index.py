@@ -0,0 +1,39 @@
+"""Add archived leads index
+
+Revision ID: f2b7d4e91c38
+Revises: e5a2c8f17b64
+Create Date: 2026-10-19 20:14:36.581402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7d4e91c38'
+down_revision: Union[str, Sequence[str], None] = 'e5a2c8f17b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('archived_leads',
+    sa.Column('lead_id', sa.Integer(), nullable=False),
+    sa.Column('business_id', sa.String(length=255), nullable=False),
+    sa.Column('captured_at', sa.DateTime(), nullable=False),
+    sa.Column('archive_file', sa.String(length=255), nullable=False),
+    sa.Column('frame_offset', sa.BigInteger(), nullable=False),
+    sa.Column('frame_length', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('lead_id')
+    )
+    op.create_index(op.f('ix_archived_leads_business_id'), 'archived_leads', ['business_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_archived_leads_business_id'), table_name='archived_leads')
+    op.drop_table('archived_leads')
@@ -1,26 +1,53 @@
 import logging
 
+import asyncio
+import datetime
 import os
 import uuid
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import StreamingResponse
+import orjson
 from pydantic import BaseModel
 from livekit import api
 from dotenv import load_dotenv
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, func, or_, and_
 
+from . import archive
 from . import security
+from . import crud
 from . import db
-from .models import businesses, leads, BusinessCreate, LeadCreate, Business, Lead
+from . import dispatch
+from . import events
+from . import logs
+from . import stats
+from . import timing
+from .responses import row_response
+from .models import (
+    businesses,
+    inquiry_tsv,
+    leads,
+    lead_columns,
+    BusinessCreate,
+    LeadCreate,
+    Business,
+    Lead,
+    LeadDailyStats,
+    LeadSearchPage,
+    LeadStatusUpdate,
+    LeadStatusUpdateResult,
+)
 
 # Load environment variables
 load_dotenv()
 
 LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
 LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
+# Set when EARLY_AGENT_DISPATCH=true: rooms are created, and agents dispatched, as tokens are minted
+early_dispatcher = dispatch.early_dispatcher_from_env()
 
-router = APIRouter()
+router = APIRouter(route_class=timing.TimedRoute)
 
 # --- Public Token Endpoint ---
 
@@ -46,7 +73,15 @@ async def get_token(request: TokenRequest):
             can_publish=True,
             can_subscribe=True,
             can_publish_data=True,
-        )).to_jwt()
+        ))
+    # Named agents are only dispatched explicitly, also when the visitor's joining creates the room.
+    room_config = dispatch.agent_dispatch_config()
+    if room_config is not None:
+        token = token.with_room_config(room_config)
+    token = token.to_jwt()
+
+    if early_dispatcher is not None:
+        await early_dispatcher.prepare_room(room_name, request.business_id)
 
     return {"token": token}
 
@@ -60,7 +95,7 @@ async def get_token(request: TokenRequest):
 )
 async def create_business(
     business: BusinessCreate,
-    database: AsyncSession = Depends(db.get_db)
+    database: AsyncSession = Depends(db.get_write_db)
 ):
     """Creates a new business in the database."""
     # Use .model_dump() for Pydantic v2
@@ -72,6 +107,7 @@ async def create_business(
         logging.error(f"DATABASE ERROR during business creation: {e}", exc_info=True)
         await database.rollback()
         raise HTTPException(status_code=500, detail="Internal Server Error creating business.")
+    db.record_write(business.id)
 
     # To return the full object including the server-set created_at, we fetch it back.
     select_query = select(businesses).where(businesses.c.id == result.inserted_primary_key[0])
@@ -81,7 +117,7 @@ async def create_business(
     if not db_business:
         raise HTTPException(status_code=500, detail="Could not retrieve newly created business.")
 
-    return dict(db_business._mapping)
+    return row_response(db_business, status_code=status.HTTP_201_CREATED)
 
 @router.get(
     "/api/internal/businesses/{business_id}",
@@ -93,14 +129,26 @@ async def get_business_profile(
     database: AsyncSession = Depends(db.get_db)
 ):
     """Fetches business-specific data from the database."""
-    query = select(businesses).where(businesses.c.id == business_id)
-    result = await database.execute(query)
-    db_business = result.first()
+    db_business = await crud.get_business(database, business_id)
 
     if db_business is None:
         raise HTTPException(status_code=404, detail="Business not found")
     
-    return db_business
+    return row_response(db_business)
+
+@router.get(
+    "/api/internal/businesses/{business_id}/stats",
+    response_model=list[LeadDailyStats],
+    dependencies=[Depends(security.get_api_key)]
+)
+async def get_business_stats(
+    business_id: str,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    database: AsyncSession = Depends(db.get_db)
+):
+    """Returns per-day lead counts for a business, broken down by status."""
+    return await stats.get_lead_stats(database, business_id, start, end)
 
 @router.post(
     "/api/internal/leads",
@@ -110,31 +158,164 @@ async def get_business_profile(
 )
 async def create_lead(
     lead: LeadCreate,
-    database: AsyncSession = Depends(db.get_db)
+    database: AsyncSession = Depends(db.get_write_db)
 ):
-    """Creates a new lead in the database."""
-    logging.info(f"Received request to create lead: {lead.model_dump()}")
-    
-    # Use .model_dump() for Pydantic v2
-    query = insert(leads).values(**lead.model_dump())
-    
+    """
+    Creates a new lead in the database.
+    Submissions carrying an idempotency_key that was already used return the
+    original lead with a 200 instead of inserting a duplicate, so clients can
+    safely retry.
+    """
+    # Logged lazily and sampled: this runs for every lead, and the payload is only
+    # rendered on the log writer thread, for the records that are kept.
+    logging.info("Received request to create lead: %r", lead, extra=logs.SAMPLED)
+
     try:
-        result = await database.execute(query)
-        await database.commit()
-        logging.info(f"Successfully inserted lead with ID: {result.inserted_primary_key[0]}")
+        db_lead, inserted = await crud.create_lead(database, lead)
     except Exception as e:
         # THIS IS THE CRITICAL LOGGING WE NEED
         logging.error(f"DATABASE ERROR during lead creation: {e}", exc_info=True)
-        await database.rollback()
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-    # Fetch the newly created lead to return the full object
-    select_query = select(leads).where(leads.c.id == result.inserted_primary_key[0])
-    new_lead_record = await database.execute(select_query)
-    db_lead = new_lead_record.first()
-
     if not db_lead:
-         raise HTTPException(status_code=500, detail="Could not retrieve newly created lead.")
+        # Another request with the same idempotency key is still being processed.
+        raise HTTPException(status_code=409, detail="A lead with this idempotency key is being created; retry shortly.")
+
+    response_status = status.HTTP_201_CREATED if inserted else status.HTTP_200_OK
+    return row_response(db_lead, status_code=response_status)
+
+@router.post(
+    "/api/internal/leads/status",
+    response_model=LeadStatusUpdateResult,
+    dependencies=[Depends(security.get_api_key)]
+)
+async def update_lead_statuses(
+    update: LeadStatusUpdate,
+    database: AsyncSession = Depends(db.get_write_db)
+):
+    """
+    Moves many leads to a new status at once, e.g. from a CRM sync.
+    Leads whose current status does not allow the transition are left as they
+    are and counted under `rejected`; unknown ids (or, with business_id, other
+    businesses' leads) under `not_found`.
+    """
+    try:
+        result = await crud.update_lead_statuses(database, update.lead_ids, update.status, update.business_id)
+    except Exception as e:
+        logging.error(f"DATABASE ERROR during lead status update: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    return row_response(result)
+
+@router.get(
+    "/api/internal/leads/search",
+    response_model=LeadSearchPage,
+    dependencies=[Depends(security.get_api_key)]
+)
+async def search_leads(
+    q: str,
+    business_id: str | None = None,
+    captured_after: datetime.datetime | None = None,
+    captured_before: datetime.datetime | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    database: AsyncSession = Depends(db.get_db)
+):
+    """
+    Full-text search over lead inquiries, best matches first.
+    Uses the GIN index on the inquiry's search vector and keyset pagination on (rank, id),
+    so later pages cost the same as the first one. A captured_after/captured_before
+    range limits the search to the monthly lead partitions it overlaps.
+    """
+    if db.IS_SQLITE:
+        raise HTTPException(status_code=501, detail="Full-text search requires a PostgreSQL database.")
+
+    ts_query = func.websearch_to_tsquery("english", q)
+    rank = func.ts_rank(inquiry_tsv, ts_query).label("rank")
+
+    query = select(*lead_columns, rank).where(inquiry_tsv.op("@@")(ts_query))
+    if business_id is not None:
+        query = query.where(leads.c.business_id == business_id)
+    if captured_after is not None:
+        query = query.where(leads.c.captured_at >= captured_after)
+    if captured_before is not None:
+        query = query.where(leads.c.captured_at < captured_before)
+    if cursor is not None:
+        try:
+            after_rank, after_id = cursor.split(":")
+            after_rank, after_id = float(after_rank), int(after_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid search cursor.")
+        query = query.where(or_(
+            rank < after_rank,
+            and_(rank == after_rank, leads.c.id < after_id),
+        ))
+    # Fetch one extra row to know whether there is another page
+    query = query.order_by(rank.desc(), leads.c.id.desc()).limit(limit + 1)
+
+    result = await database.execute(query)
+    rows = [dict(row._mapping) for row in result]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1]['rank']!r}:{rows[-1]['id']}"
+
+    return row_response({"results": rows, "next_cursor": next_cursor})
+
+@router.get(
+    "/api/internal/leads/archived/{lead_id}",
+    response_model=Lead,
+    dependencies=[Depends(security.get_api_key)]
+)
+async def get_archived_lead(
+    lead_id: int,
+    database: AsyncSession = Depends(db.get_db)
+):
+    """Fetches a lead that was moved to the archive files by app/archive.py."""
+    db_lead = await archive.read_archived_lead(database, lead_id)
+    if db_lead is None:
+        raise HTTPException(status_code=404, detail="Archived lead not found")
+    return row_response(db_lead)
+
+# Seconds between comment lines sent on an idle event stream, so proxies keep it open
+LEAD_EVENTS_KEEPALIVE = 15
+
+async def _lead_event_stream(business_id: str | None):
+    # Subscribed only once the body is streamed: a response that never gets
+    # that far (the client left first) has nothing to unsubscribe.
+    try:
+        subscription = events.bus.subscribe(business_id)
+    except events.TooManySubscribersError as e:
+        # Filled up since the endpoint checked; the client reconnects.
+        logging.warning("Closing lead event stream: %s", e)
+        return
+    try:
+        while True:
+            try:
+                lead = await asyncio.wait_for(subscription.queue.get(), LEAD_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if subscription.dropped:
+                # The consumer fell behind; it should catch up through /api/internal/leads/search.
+                yield b"event: overflow\ndata: " + orjson.dumps({"dropped": subscription.dropped}) + b"\n\n"
+                subscription.dropped = 0
+            data = orjson.dumps(lead, option=orjson.OPT_NON_STR_KEYS)
+            yield f"id: {lead['id']}\nevent: lead_created\ndata: ".encode() + data + b"\n\n"
+    finally:
+        events.bus.unsubscribe(subscription)
 
-    # Manually convert the SQLAlchemy Row object to a dictionary before returning
-    return dict(db_lead._mapping)
\ No newline at end of file
+@router.get("/api/internal/leads/events", dependencies=[Depends(security.get_api_key)])
+async def stream_lead_events(business_id: str | None = None):
+    """
+    Server-sent events stream of newly created leads, of one business or of
+    all of them. Events arrive as leads are committed, without polling.
+    """
+    if events.bus.is_full():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many lead event subscribers.")
+    return StreamingResponse(
+        _lead_event_stream(business_id),
+        media_type="text/event-stream",
+        # Stops nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
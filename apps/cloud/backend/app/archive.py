@@ -0,0 +1,155 @@
+"""
+Moves cold leads out of the database into zstd-compressed JSONL files.
+
+Leads captured before a cutoff are streamed in primary-key order through a
+server-side cursor, --batch-size at a time. Each batch becomes one
+independently compressed zstd frame, appended to the current archive file and
+fsynced; then, in one small transaction, the batch's leads are deleted and an
+entry per lead (file, frame offset and length) is recorded in archived_leads.
+A single lead is later read back by decompressing just its frame.
+
+Concatenated zstd frames form a valid zstd stream, so `zstd -dc FILE` also
+yields the whole file as JSONL. The lead_daily_stats rollups are left as they
+are, so dashboards keep counting archived leads.
+
+Run from apps/cloud/backend:
+    python -m app.archive --older-than-days 365
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+
+import orjson
+import zstandard
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import db
+from . import logs
+from .models import archived_leads, leads, lead_columns, lead_idempotency_keys
+
+# Directory holding the archive files
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+# Leads per zstd frame and per delete transaction
+ARCHIVE_BATCH_SIZE = 1000
+# Leads per archive file, which is also how long one cursor (and the
+# snapshot it holds) stays open
+ARCHIVE_ROWS_PER_FILE = 100_000
+ZSTD_LEVEL = 10
+
+
+def _write_frame(path: str, rows: list[dict]) -> tuple[int, int]:
+    """Appends the rows as one compressed frame and fsyncs; returns its offset and length."""
+    # Column names are str subclasses, which orjson only takes with OPT_NON_STR_KEYS.
+    lines = b"".join(orjson.dumps(row, option=orjson.OPT_NON_STR_KEYS) + b"\n" for row in rows)
+    frame = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(lines)
+    with open(path, "ab") as archive_file:
+        offset = archive_file.tell()
+        archive_file.write(frame)
+        archive_file.flush()
+        os.fsync(archive_file.fileno())
+    return offset, len(frame)
+
+
+def _read_frame(path: str, offset: int, length: int) -> list[dict]:
+    with open(path, "rb") as archive_file:
+        archive_file.seek(offset)
+        frame = archive_file.read(length)
+    data = zstandard.ZstdDecompressor().decompress(frame)
+    return [orjson.loads(line) for line in data.splitlines()]
+
+
+async def archive_leads(
+    cutoff: datetime.datetime,
+    archive_dir: str = ARCHIVE_DIR,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    rows_per_file: int = ARCHIVE_ROWS_PER_FILE,
+    pause: float = 0.05,
+) -> int:
+    """
+    Archives the leads captured before `cutoff`; returns how many. Safe to
+    interrupt and rerun: a batch is only deleted once its frame is on disk,
+    and a frame whose delete did not commit is simply never referenced.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = 0
+    while True:
+        file_rows = 0
+        # One cursor per archive file, so no snapshot is held for the whole run.
+        async with db.engine.connect() as reader:
+            result = await reader.stream(
+                select(*lead_columns).where(leads.c.captured_at < cutoff).order_by(leads.c.id).limit(rows_per_file),
+                execution_options={"yield_per": batch_size},
+            )
+            file_name = None
+            async for batch in result.partitions(batch_size):
+                rows = [dict(row._mapping) for row in batch]
+                if file_name is None:
+                    file_name = f"leads-{rows[0]['id']:012d}.jsonl.zst"
+                offset, length = await asyncio.to_thread(_write_frame, os.path.join(archive_dir, file_name), rows)
+
+                lead_ids = [row["id"] for row in rows]
+                async with db.write_session() as session:
+                    # captured_at < cutoff limits the delete to the old partitions.
+                    await session.execute(
+                        delete(leads).where(leads.c.id.in_(lead_ids), leads.c.captured_at < cutoff)
+                    )
+                    keys = [row["idempotency_key"] for row in rows if row["idempotency_key"] is not None]
+                    if keys and not db.IS_SQLITE:
+                        await session.execute(
+                            delete(lead_idempotency_keys).where(lead_idempotency_keys.c.idempotency_key.in_(keys))
+                        )
+                    await session.execute(insert(archived_leads), [
+                        {
+                            "lead_id": row["id"],
+                            "business_id": row["business_id"],
+                            "captured_at": row["captured_at"],
+                            "archive_file": file_name,
+                            "frame_offset": offset,
+                            "frame_length": length,
+                        }
+                        for row in rows
+                    ])
+                    await session.commit()
+
+                file_rows += len(rows)
+                logging.info("Archived %s leads to %s, up to lead %s", len(rows), file_name, lead_ids[-1])
+                await asyncio.sleep(pause)
+        archived += file_rows
+        if file_rows < rows_per_file:
+            break
+    logging.info("Archived %s leads captured before %s", archived, cutoff.isoformat())
+    return archived
+
+
+async def read_archived_lead(database: AsyncSession, lead_id: int, archive_dir: str = ARCHIVE_DIR) -> dict | None:
+    """Fetches one archived lead: an index lookup, then a single frame read."""
+    entry = (await database.execute(
+        select(archived_leads).where(archived_leads.c.lead_id == lead_id)
+    )).first()
+    if entry is None:
+        return None
+    rows = await asyncio.to_thread(
+        _read_frame, os.path.join(archive_dir, entry.archive_file), entry.frame_offset, entry.frame_length
+    )
+    return next((row for row in rows if row["id"] == lead_id), None)
+
+
+async def main(args):
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=args.older_than_days)
+    try:
+        await archive_leads(cutoff, args.archive_dir, args.batch_size, pause=args.pause)
+    finally:
+        await db.dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than-days", type=int, required=True, help="Archive leads captured more than this many days ago.")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="Leads per compressed frame and per delete.")
+    parser.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between batches.")
+    logs.setup_logging()
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,204 @@
+import datetime
+import logging
+from collections import Counter
+
+from sqlalchemy import Integer, and_, any_, bindparam, delete, func, insert, literal, select, literal_column, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import db
+from . import events
+from . import logs
+from . import stats
+from .models import businesses, leads, lead_columns, lead_idempotency_keys, LeadCreate, LEAD_STATUS_TRANSITIONS
+
+# Data-access functions shared by the HTTP endpoints in api.py and by clients
+# that run in the same process as the database engine (see the cloud agent's
+# direct backend transport).
+
+# Leads moved per statement, and per transaction, by update_lead_statuses
+STATUS_UPDATE_BATCH_SIZE = 1000
+
+
+async def get_business(database: AsyncSession, business_id: str) -> Row | None:
+    """Fetches one business profile."""
+    query = select(businesses).where(businesses.c.id == business_id)
+    result = await database.execute(query)
+    return result.first()
+
+
+def _lead_event(row: Row) -> dict:
+    lead = dict(row._mapping)
+    del lead["inserted"]
+    return lead
+
+
+async def create_lead(database: AsyncSession, lead: LeadCreate) -> tuple[dict | None, bool]:
+    """
+    Inserts a lead and updates the lead stats in one transaction, then commits.
+    Returns the lead and whether it was inserted now (False when its idempotency_key
+    was already used, in which case the original lead is returned). Rolls back and
+    re-raises on database errors.
+    """
+    # Use .model_dump() for Pydantic v2
+    values = lead.model_dump()
+    if db.IS_SQLITE:
+        # SQLite has no xmax, so on conflict we insert nothing and read the original back.
+        query = db.dialect_insert(leads).values(**values).on_conflict_do_nothing(
+            index_elements=[leads.c.idempotency_key],
+        ).returning(*lead_columns, literal_column("1").label("inserted"))
+        existing_query = select(*lead_columns, literal_column("0").label("inserted")) \
+            .where(leads.c.idempotency_key == lead.idempotency_key)
+    elif lead.idempotency_key is None:
+        query = insert(leads).values(**values).returning(*lead_columns, literal_column("1").label("inserted"))
+    else:
+        # The partitioned leads table cannot hold a unique index on the key, so
+        # one statement claims the key in lead_idempotency_keys, drawing the
+        # lead's id and capture time there, and inserts the lead only if the
+        # claim succeeded. A duplicate inserts nothing and reads the original back.
+        claim = pg_insert(lead_idempotency_keys).values(
+            idempotency_key=lead.idempotency_key,
+            lead_id=func.nextval("leads_id_seq"),
+            captured_at=datetime.datetime.utcnow(),
+        ).on_conflict_do_nothing(
+            index_elements=[lead_idempotency_keys.c.idempotency_key],
+        ).returning(lead_idempotency_keys.c.lead_id, lead_idempotency_keys.c.captured_at).cte("claim")
+        # INSERT ... SELECT leaves out the Python-side column defaults, so set the status here.
+        values = {"status": leads.c.status.default.arg, **values}
+        columns = {name: literal(value, leads.c[name].type) for name, value in values.items()}
+        query = insert(leads).from_select(
+            ["id", "captured_at", *columns],
+            select(claim.c.lead_id, claim.c.captured_at, *columns.values()),
+        ).returning(*lead_columns, literal_column("1").label("inserted"))
+        # Joining on the whole primary key lets Postgres look in one partition only.
+        existing_query = select(*lead_columns, literal_column("0").label("inserted")) \
+            .join_from(leads, lead_idempotency_keys, and_(
+                leads.c.id == lead_idempotency_keys.c.lead_id,
+                leads.c.captured_at == lead_idempotency_keys.c.captured_at,
+            )).where(lead_idempotency_keys.c.idempotency_key == lead.idempotency_key)
+
+    try:
+        result = await database.execute(query)
+        db_lead = result.first()
+        if db_lead is None and lead.idempotency_key is not None:
+            db_lead = (await database.execute(existing_query)).first()
+            if db_lead is None and not db.IS_SQLITE:
+                # The key's lead is gone (its partition was detached or dropped,
+                # or it was archived), so the key is free again: insert afresh.
+                await database.execute(
+                    delete(lead_idempotency_keys).where(lead_idempotency_keys.c.idempotency_key == lead.idempotency_key)
+                )
+                db_lead = (await database.execute(query)).first() or (await database.execute(existing_query)).first()
+        if db_lead and db_lead.inserted:
+            await stats.increment_lead_stats(
+                database, db_lead.business_id, db_lead.captured_at.date(), db_lead.status
+            )
+            if not db.IS_SQLITE:
+                # Postgres sends the event only once this transaction commits.
+                await events.notify_lead_created(database, _lead_event(db_lead))
+        await database.commit()
+    except Exception:
+        await database.rollback()
+        raise
+
+    if db_lead is None:
+        return None, False
+
+    db.record_write(db_lead.business_id)
+    db_lead = dict(db_lead._mapping)
+    inserted = bool(db_lead.pop("inserted"))
+    if inserted:
+        logging.info("Successfully inserted lead with ID: %s", db_lead["id"], extra=logs.SAMPLED)
+        if db.IS_SQLITE:
+            # The embedded database is only served by this process (agents reach
+            # it over HTTP: BACKEND_TRANSPORT=direct refuses SQLite).
+            events.bus.publish(db_lead)
+    else:
+        logging.info("Duplicate lead submission for idempotency key %s, returning lead %s", lead.idempotency_key, db_lead["id"])
+    return db_lead, inserted
+
+
+def _lead_id_in(lead_ids: list[int]):
+    """`id = ANY(:ids)`, binding the whole batch as a single array parameter on Postgres."""
+    if db.IS_SQLITE:
+        return leads.c.id.in_(lead_ids)
+    return leads.c.id == any_(bindparam("lead_ids", lead_ids, type_=ARRAY(Integer)))
+
+
+async def update_lead_statuses(
+    database: AsyncSession, lead_ids: list[int], new_status: str, business_id: str | None = None
+) -> dict:
+    """
+    Moves leads to `new_status` where LEAD_STATUS_TRANSITIONS allows it from
+    their current status, optionally only those of `business_id`, and adjusts
+    the lead stats. Returns how many leads were updated, rejected (by their
+    current status) and not found.
+
+    Leads are updated in batches of STATUS_UPDATE_BATCH_SIZE: each is one
+    set-based UPDATE, with the transition checked in its WHERE clause, and one
+    stats upsert, committed together. A database error rolls back the failing
+    batch and re-raises; earlier batches stay committed.
+    """
+    allowed_from = [status for status, targets in LEAD_STATUS_TRANSITIONS.items() if new_status in targets]
+    current_status = func.coalesce(leads.c.status, "new")
+    lead_ids = sorted(set(lead_ids))
+    updated = 0
+    rejected = Counter()
+    not_found = 0
+
+    for start in range(0, len(lead_ids), STATUS_UPDATE_BATCH_SIZE):
+        batch = lead_ids[start:start + STATUS_UPDATE_BATCH_SIZE]
+        scope = [_lead_id_in(batch)]
+        if business_id is not None:
+            scope.append(leads.c.business_id == business_id)
+        try:
+            if db.IS_SQLITE:
+                # SQLite's RETURNING cannot see the old status, so read it first;
+                # the single-writer lock keeps it current until the update.
+                moved = (await database.execute(
+                    select(leads.c.id, leads.c.business_id, leads.c.captured_at, current_status.label("old_status"))
+                    .where(*scope, current_status.in_(allowed_from))
+                )).all()
+                if moved:
+                    await database.execute(
+                        update(leads).where(leads.c.id.in_([row.id for row in moved])).values(status=new_status)
+                    )
+            else:
+                # Lock the leads that may move in id order, so concurrent bulk
+                # updates cannot deadlock, and keep their old status for the stats.
+                movable = select(leads.c.id, current_status.label("old_status")) \
+                    .where(*scope, current_status.in_(allowed_from)) \
+                    .order_by(leads.c.id).with_for_update().cte("movable")
+                moved = (await database.execute(
+                    update(leads).where(leads.c.id == movable.c.id).values(status=new_status)
+                    .returning(leads.c.id, leads.c.business_id, leads.c.captured_at, movable.c.old_status)
+                )).all()
+
+            deltas = Counter()
+            for row in moved:
+                if row.captured_at is not None:
+                    deltas[(row.business_id, row.captured_at.date(), row.old_status)] -= 1
+                    deltas[(row.business_id, row.captured_at.date(), new_status)] += 1
+            await stats.adjust_lead_stats(database, deltas)
+
+            if len(moved) < len(batch):
+                moved_ids = {row.id for row in moved}
+                remaining = [lead_id for lead_id in batch if lead_id not in moved_ids]
+                query = select(current_status, func.count()).where(_lead_id_in(remaining)).group_by(current_status)
+                if business_id is not None:
+                    query = query.where(leads.c.business_id == business_id)
+                found = dict((await database.execute(query)).all())
+                rejected.update(found)
+                not_found += len(remaining) - sum(found.values())
+            await database.commit()
+        except Exception:
+            await database.rollback()
+            raise
+
+        updated += len(moved)
+        for written_business_id in {row.business_id for row in moved}:
+            db.record_write(written_business_id)
+
+    logging.info("Moved %s of %s leads to status %s", updated, len(lead_ids), new_status)
+    return {"requested": len(lead_ids), "updated": updated, "rejected": dict(rejected), "not_found": not_found}
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+
+import asyncpg
+import orjson
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+# Lead-created events, pushed to consumers (CRM sync, alerts, dashboards) instead
+# of them polling the leads table.
+#
+# On Postgres, create_lead sends a NOTIFY on LEAD_EVENTS_CHANNEL in its
+# transaction, so the event goes out only if the lead is committed, and reaches
+# every backend process, whichever one (or which agent) inserted the lead.
+# Each process LISTENs on one dedicated connection and fans the events out to
+# its own subscribers. On the embedded SQLite database, the process that
+# inserts the lead publishes it directly.
+
+LEAD_EVENTS_CHANNEL = "lead_created"
+# Events buffered per subscriber; a consumer that falls this far behind misses
+# events and is told how many.
+LEAD_EVENTS_BUFFER = int(os.getenv("LEAD_EVENTS_BUFFER", "100"))
+LEAD_EVENTS_MAX_SUBSCRIBERS = int(os.getenv("LEAD_EVENTS_MAX_SUBSCRIBERS", "100"))
+# NOTIFY payloads are limited to 8000 bytes; longer inquiries are cut to fit.
+_MAX_PAYLOAD_BYTES = 7900
+
+
+class TooManySubscribersError(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, business_id: str | None, buffer_size: int):
+        """Receives the events of one business, or of all businesses when business_id is None."""
+        self.business_id = business_id
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=buffer_size)
+        # Events dropped because the buffer was full, since the consumer was last told
+        self.dropped = 0
+
+
+class LeadEventBus:
+    def __init__(self, buffer_size: int = LEAD_EVENTS_BUFFER, max_subscribers: int = LEAD_EVENTS_MAX_SUBSCRIBERS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._subscriptions: set[Subscription] = set()
+
+    def is_full(self) -> bool:
+        return len(self._subscriptions) >= self.max_subscribers
+
+    def subscribe(self, business_id: str | None = None) -> Subscription:
+        if self.is_full():
+            raise TooManySubscribersError(f"{len(self._subscriptions)} lead event subscribers already connected")
+        subscription = Subscription(business_id, self.buffer_size)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, lead: dict):
+        """Hands the lead to every matching subscriber without waiting on any of them."""
+        for subscription in self._subscriptions:
+            if subscription.business_id is not None and subscription.business_id != lead["business_id"]:
+                continue
+            try:
+                subscription.queue.put_nowait(lead)
+            except asyncio.QueueFull:
+                subscription.dropped += 1
+
+
+bus = LeadEventBus()
+
+
+def _payload(lead: dict) -> str:
+    payload = orjson.dumps(lead, option=orjson.OPT_NON_STR_KEYS)
+    if len(payload) > _MAX_PAYLOAD_BYTES:
+        overflow = len(payload) - _MAX_PAYLOAD_BYTES
+        inquiry = lead["inquiry"].encode()[:-overflow - 3].decode(errors="ignore")
+        payload = orjson.dumps({**lead, "inquiry": inquiry + "...", "inquiry_truncated": True}, option=orjson.OPT_NON_STR_KEYS)
+    return payload.decode()
+
+
+async def notify_lead_created(database: AsyncSession, lead: dict):
+    """Postgres only: queues the event in the current transaction, to be sent when it commits."""
+    await database.execute(select(func.pg_notify(LEAD_EVENTS_CHANNEL, _payload(lead))))
+
+
+def _on_notification(connection, pid, channel, payload):
+    try:
+        bus.publish(orjson.loads(payload))
+    except (orjson.JSONDecodeError, KeyError) as e:
+        logging.error("Ignoring malformed lead event: %s", e)
+
+
+async def listen_forever(engine: AsyncEngine, retry_delay: float = 5.0):
+    """
+    Feeds the bus from Postgres notifications, on a connection of its own
+    (outside the engine's pool), reconnecting whenever it is lost.
+    """
+    dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn)
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            await connection.add_listener(LEAD_EVENTS_CHANNEL, _on_notification)
+            logging.info("Listening for lead events on channel %s", LEAD_EVENTS_CHANNEL)
+            await lost.wait()
+            logging.warning("Lead event listener connection lost, reconnecting")
+        except (asyncpg.PostgresError, OSError) as e:
+            logging.error("Lead event listener failed, retrying in %ss: %s", retry_delay, e)
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        await asyncio.sleep(retry_delay)
@@ -0,0 +1,163 @@
+import asyncio
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+# Pass as `extra=SAMPLED` on hot paths (every request, RPC or tool call) to keep
+# only a LOG_SAMPLE_RATE fraction of those records.
+SAMPLED = {"sample_rate": float(os.getenv("LOG_SAMPLE_RATE", "0.1"))}
+
+# Attributes every LogRecord has; anything else was passed through `extra`.
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "sample_rate"}
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of high-volume records: those logged with
+    `extra={"sample_rate": 0.01}` pass 1% of the time. Warnings and errors are always kept.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in record.__dict__.items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread as they are. Unlike QueueHandler, it does
+    not format them first, so the message is only built (and only if the record
+    is kept) off the event loop; arguments must therefore not be mutated after
+    the call. When the queue is full the record is dropped rather than waited on.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: str | None = None, json_format: bool | None = None, stream=None, max_queued: int = 10_000) -> NonBlockingQueueHandler:
+    """
+    Routes the root logger through a bounded queue to a background writer thread,
+    so logging never does stream I/O on the event loop. LOG_LEVEL (default INFO)
+    and LOG_FORMAT ("json", the default, or "text") configure it.
+    """
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if json_format is None:
+        json_format = os.getenv("LOG_FORMAT", "json") == "json"
+
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JSONFormatter() if json_format else logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=max_queued))
+    # Sample before queueing, so dropped records cost nothing on the writer thread either.
+    handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(handler.queue, writer, respect_handler_level=True)
+    listener.start()
+    # Flush what is still queued when the process exits.
+    atexit.register(listener.stop)
+    return handler
+
+
+_file_loggers_lock = threading.Lock()
+
+
+def file_logger(name: str, path: str, max_queued: int = 10_000) -> logging.Logger:
+    """
+    A logger that appends each message, as is, as one line of `path`, written by
+    a background thread like setup_logging's output. Its records stay out of the
+    root logger. Set up on first use; later calls return the same logger.
+    """
+    logger = logging.getLogger(name)
+    with _file_loggers_lock:
+        if not logger.handlers:
+            handler = NonBlockingQueueHandler(queue.Queue(maxsize=max_queued))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            listener = logging.handlers.QueueListener(handler.queue, logging.FileHandler(path))
+            listener.start()
+            atexit.register(listener.stop)
+    return logger
+
+
+class EventLoopLagMonitor:
+    def __init__(self, interval: float = 0.1, report_every: float = 60.0):
+        """
+        Measures how late the event loop wakes up from a sleep of `interval`
+        seconds, i.e. how long callbacks were blocked, and logs a summary every
+        `report_every` seconds.
+        """
+        self.interval = interval
+        self.report_every = report_every
+        self.samples: list[float] = []
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        last_report = time.monotonic()
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.samples.append(max(0.0, now - started - self.interval))
+            if now - last_report >= self.report_every:
+                logging.info("Event loop lag: %s", self.snapshot())
+                self.samples.clear()
+                last_report = now
+
+    def snapshot(self) -> dict:
+        lags = sorted(self.samples)
+        if not lags:
+            return {"samples": 0}
+        return {
+            "samples": len(lags),
+            "p50_ms": round(lags[len(lags) // 2] * 1000, 2),
+            "p99_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 2),
+            "max_ms": round(lags[-1] * 1000, 2),
+        }
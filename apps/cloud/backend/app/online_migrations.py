@@ -0,0 +1,219 @@
+import contextlib
+import logging
+import time
+
+import sqlalchemy as sa
+from alembic import op
+
+# Helpers for Alembic migrations that must not block lead capture on large tables.
+#
+# Plain DDL on Postgres takes an ACCESS EXCLUSIVE or SHARE lock for as long as
+# the statement (and its transaction) runs: CREATE INDEX blocks every insert
+# into `leads` until the index is built, and ADD FOREIGN KEY scans the whole
+# table under a lock. The helpers below split that work so only brief locks are
+# held, and run each step in its own transaction. On SQLite (the embedded mode)
+# they fall back to the plain operations, as its tables are small.
+#
+# Requires `transaction_per_migration` (set in alembic/env.py): the
+# non-transactional steps commit whatever the current migration did before them.
+
+CHECKPOINT_TABLE = "online_migration_checkpoints"
+
+# A child of the "alembic" logger, so progress shows with alembic's own output.
+logger = logging.getLogger("alembic.online_migrations")
+
+
+def _is_postgres() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def _constraint_exists(table_name: str, constraint_name: str) -> bool:
+    """Lets a rerun of a partly applied migration skip constraints it already added."""
+    if op.get_context().as_sql:
+        return False
+    return op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_constraint WHERE conrelid = CAST(:table AS regclass) AND conname = :name"
+    ), {"table": table_name, "name": constraint_name}).first() is not None
+
+
+def _outside_transaction():
+    """Commits the migration's transaction so far and runs the block in autocommit mode (Postgres only)."""
+    return op.get_context().autocommit_block() if _is_postgres() else contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def lock_timeout(timeout: str = "5s"):
+    """
+    Makes DDL inside the block give up after `timeout` waiting for its lock,
+    instead of queueing every later lead insert behind it. The migration then
+    fails and can simply be retried at a quieter moment.
+    """
+    if not _is_postgres():
+        yield
+        return
+    op.execute(f"SET lock_timeout = '{timeout}'")
+    yield
+    # Not reached on errors; the transaction rolls the setting back then.
+    op.execute("RESET lock_timeout")
+
+
+def create_index_concurrently(index_name: str, table_name: str, columns: list[str], unique: bool = False, **kw):
+    """
+    CREATE INDEX CONCURRENTLY: builds the index while inserts and updates go on.
+    A concurrent build that failed halfway leaves an invalid index behind, which
+    is dropped and rebuilt, so the migration can be rerun after a failure.
+    """
+    if not _is_postgres():
+        op.create_index(index_name, table_name, columns, unique=unique, **kw)
+        return
+    with op.get_context().autocommit_block():
+        invalid = not op.get_context().as_sql and op.get_bind().execute(sa.text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": index_name}).first()
+        if invalid:
+            logger.warning("Dropping index %s left invalid by an interrupted build", index_name)
+            op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True)
+        op.create_index(
+            index_name, table_name, columns, unique=unique,
+            postgresql_concurrently=True, if_not_exists=True, **kw
+        )
+
+
+def drop_index_concurrently(index_name: str, table_name: str, **kw):
+    """DROP INDEX CONCURRENTLY: drops the index without blocking writes to the table."""
+    if not _is_postgres():
+        op.drop_index(index_name, table_name=table_name, **kw)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True, **kw)
+
+
+def add_foreign_key_not_valid(
+    constraint_name: str, source_table: str, referent_table: str, local_cols: list[str], remote_cols: list[str], **kw
+):
+    """
+    Adds a foreign key that is enforced for new rows right away, but does not
+    check the existing rows, so it only needs a brief lock. Follow it with
+    validate_constraint, in this migration or a later one.
+    """
+    if not _is_postgres():
+        op.create_foreign_key(constraint_name, source_table, referent_table, local_cols, remote_cols, **kw)
+        return
+    if _constraint_exists(source_table, constraint_name):
+        return
+    with lock_timeout():
+        op.create_foreign_key(
+            constraint_name, source_table, referent_table, local_cols, remote_cols, postgresql_not_valid=True, **kw
+        )
+
+
+def add_check_constraint_not_valid(constraint_name: str, table_name: str, condition: str, **kw):
+    """Like add_foreign_key_not_valid, for a CHECK constraint; follow it with validate_constraint."""
+    if not _is_postgres():
+        op.create_check_constraint(constraint_name, table_name, condition, **kw)
+        return
+    if _constraint_exists(table_name, constraint_name):
+        return
+    with lock_timeout():
+        op.create_check_constraint(constraint_name, table_name, condition, postgresql_not_valid=True, **kw)
+
+
+def validate_constraint(table_name: str, constraint_name: str):
+    """
+    Checks the existing rows against a NOT VALID constraint. This scans the
+    table, but only under a SHARE UPDATE EXCLUSIVE lock, which lets reads and
+    writes continue; it runs in its own transaction so the lock taken when the
+    constraint was added is not held for the scan.
+    """
+    if not _is_postgres():
+        return
+    with op.get_context().autocommit_block():
+        op.execute(f'ALTER TABLE "{table_name}" VALIDATE CONSTRAINT "{constraint_name}"')
+
+
+def wait_for_older_transactions(poll_interval: float = 1.0):
+    """
+    Waits until every transaction that was running when this was called has
+    ended, as CREATE INDEX CONCURRENTLY does: whatever they wrote (or took from
+    a sequence) is then committed or gone for good. Call it outside a
+    transaction (in an autocommit block); a long-running session elsewhere
+    makes it wait as long.
+    """
+    if not _is_postgres() or op.get_context().as_sql:
+        return
+    connection = op.get_bind()
+    # Every transaction holds a lock on its virtual transaction id until it
+    # ends, including those that have not written anything yet.
+    running = sa.text(
+        "SELECT virtualxid FROM pg_locks WHERE locktype = 'virtualxid' AND granted "
+        "AND pid <> pg_backend_pid() AND (CAST(:older AS text[]) IS NULL OR virtualxid = ANY(CAST(:older AS text[])))"
+    )
+    older = connection.execute(running, {"older": None}).scalars().all()
+    started = time.monotonic()
+    while older:
+        time.sleep(poll_interval)
+        older = connection.execute(running, {"older": older}).scalars().all()
+        if older and time.monotonic() - started > 30:
+            logger.warning("Still waiting for %s older transactions to end", len(older))
+            started = time.monotonic()
+
+
+def backfill_in_batches(
+    name: str,
+    table_name: str,
+    set_sql: str,
+    where_sql: str = "TRUE",
+    key_column: str = "id",
+    batch_size: int = 5000,
+    pause: float = 0.1,
+):
+    """
+    Runs `UPDATE table SET <set_sql> WHERE <where_sql>` in batches of
+    `batch_size` consecutive `key_column` values (an integer primary key).
+    On Postgres every statement commits on its own, and each batch is followed by a `pause`
+    in seconds, so row locks are short-lived and replicas keep up.
+
+    Progress is checkpointed under `name` after every batch; a migration that
+    was interrupted resumes from the last completed batch when it is rerun. The
+    update of the batch in progress may run twice, so it must be idempotent
+    (`where_sql` should skip rows that were already backfilled).
+    """
+    if op.get_context().as_sql:
+        # Offline (--sql) mode cannot read the table, so emit a single UPDATE.
+        op.execute(f'UPDATE "{table_name}" SET {set_sql} WHERE {where_sql}')
+        return
+
+    connection = op.get_bind()
+    checkpoints = sa.table(CHECKPOINT_TABLE, sa.column("name"), sa.column("last_key"), sa.column("updated_at"))
+    with _outside_transaction():
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} ("
+            "name VARCHAR(255) PRIMARY KEY, last_key BIGINT NOT NULL, updated_at TIMESTAMP NOT NULL)"
+        )
+        last_key = connection.execute(
+            sa.select(checkpoints.c.last_key).where(checkpoints.c.name == name)
+        ).scalar()
+        if last_key is None:
+            last_key = (connection.execute(sa.text(f'SELECT MIN("{key_column}") - 1 FROM "{table_name}"')).scalar() or 0)
+            connection.execute(sa.insert(checkpoints).values(name=name, last_key=last_key, updated_at=sa.func.now()))
+        # Rows inserted after this point are written by the new code already.
+        max_key = connection.execute(sa.text(f'SELECT MAX("{key_column}") FROM "{table_name}"')).scalar() or 0
+
+        update = sa.text(
+            f'UPDATE "{table_name}" SET {set_sql} '
+            f'WHERE "{key_column}" > :low AND "{key_column}" <= :high AND ({where_sql})'
+        )
+        started = time.monotonic()
+        updated = 0
+        while last_key < max_key:
+            high = min(last_key + batch_size, max_key)
+            updated += connection.execute(update, {"low": last_key, "high": high}).rowcount
+            connection.execute(
+                sa.update(checkpoints).where(checkpoints.c.name == name)
+                .values(last_key=high, updated_at=sa.func.now())
+            )
+            last_key = high
+            logger.info("Backfill %s: %s rows updated, up to %s %s of %s", name, updated, key_column, last_key, max_key)
+            time.sleep(pause)
+        logger.info("Backfill %s done: %s rows updated in %.1fs", name, updated, time.monotonic() - started)
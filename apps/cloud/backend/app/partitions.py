@@ -0,0 +1,154 @@
+import asyncio
+import datetime
+import logging
+import os
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# On Postgres the leads table is partitioned by month on captured_at (see the
+# alembic revision "Partition leads by month"). Partitions are named
+# leads_pYYYY_MM; leads_legacy holds everything captured before the first one.
+# The embedded SQLite mode keeps a single leads table.
+LEGACY_PARTITION = "leads_legacy"
+
+# Partitions are created this many months ahead, so inserts always find one.
+LEAD_PARTITIONS_AHEAD = int(os.getenv("LEAD_PARTITIONS_AHEAD", "3"))
+# Partitions whose months all lie more than this many months back are
+# detached (kept as standalone tables, e.g. for archiving) or, with
+# LEAD_RETENTION_ACTION=drop, dropped. 0 keeps every lead.
+LEAD_RETENTION_MONTHS = int(os.getenv("LEAD_RETENTION_MONTHS", "0"))
+LEAD_RETENTION_ACTION = os.getenv("LEAD_RETENTION_ACTION", "detach")
+# How often each backend process runs the maintenance
+PARTITION_MAINTENANCE_INTERVAL = 6 * 3600
+# Held while maintaining, so concurrent backend processes take turns
+_ADVISORY_LOCK_ID = 4_736_210_047
+
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    return day.replace(day=1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"leads_p{month:%Y_%m}"
+
+
+def create_partition_sql(month: datetime.date) -> str:
+    """DDL for the partition holding the leads captured in `month`; a no-op if it exists."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF leads "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+async def _partitions(connection) -> dict[str, datetime.date]:
+    """Maps each partition of leads to the (exclusive) upper bound of its capture times."""
+    result = await connection.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'leads'::regclass"
+    ))
+    partitions = {}
+    for name, bound in result:
+        upper = _UPPER_BOUND.search(bound)
+        if upper:
+            partitions[name] = datetime.date.fromisoformat(upper.group(1)[:10])
+    return partitions
+
+
+async def ensure_partitions(connection, today: datetime.date, ahead: int = LEAD_PARTITIONS_AHEAD) -> list[str]:
+    """Creates the partitions for this month and the next `ahead` months that do not exist yet."""
+    partitions = await _partitions(connection)
+    # Months still covered by leads_legacy need no partition of their own.
+    legacy_until = partitions.get(LEGACY_PARTITION, datetime.date.min)
+    created = []
+    for months in range(ahead + 1):
+        month = add_months(month_start(today), months)
+        if month >= legacy_until and partition_name(month) not in partitions:
+            await connection.execute(text(create_partition_sql(month)))
+            created.append(partition_name(month))
+    return created
+
+
+async def apply_retention(
+    connection, today: datetime.date, months: int = LEAD_RETENTION_MONTHS, action: str = LEAD_RETENTION_ACTION
+) -> list[str]:
+    """
+    Detaches (or drops) the partitions that only hold leads captured before
+    the retention cutoff. DETACH ... CONCURRENTLY keeps lead inserts and reads
+    going meanwhile, and needs an autocommit connection.
+    """
+    if months <= 0:
+        return []
+    cutoff = add_months(month_start(today), -months)
+    partitions = await _partitions(connection)
+    expired = [name for name, upper in partitions.items() if upper <= cutoff]
+    # A concurrent detach that was interrupted must be finished with FINALIZE.
+    pending = set((await connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'leads'::regclass AND i.inhdetachpending"
+    ))).scalars())
+    for name in expired:
+        mode = "FINALIZE" if name in pending else "CONCURRENTLY"
+        await connection.execute(text(f"ALTER TABLE leads DETACH PARTITION {name} {mode}"))
+        if action == "drop":
+            await connection.execute(text(f"DROP TABLE {name}"))
+    await _delete_detached_keys(connection, {name: upper for name, upper in partitions.items() if name not in expired})
+    return expired
+
+
+async def _delete_detached_keys(connection, attached: dict[str, datetime.date]):
+    """
+    Deletes the idempotency keys of leads no longer in any attached partition,
+    as archive.py does for archived leads; otherwise the table keeps growing.
+    This also catches keys left behind by an earlier run that stopped midway.
+    """
+    if LEGACY_PARTITION in attached or not attached:
+        # leads_legacy starts at MINVALUE; without partitions there is nothing to compare against.
+        return
+    # Monthly partitions each hold one month, ending at their upper bound.
+    kept_from = add_months(min(attached.values()), -1)
+    await connection.execute(
+        text("DELETE FROM lead_idempotency_keys WHERE captured_at < :kept_from"), {"kept_from": kept_from}
+    )
+
+
+async def maintain(engine: AsyncEngine, today: datetime.date | None = None):
+    """Creates upcoming partitions and applies the retention policy once."""
+    today = today or datetime.datetime.utcnow().date()
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        partitioned = (await connection.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = 'leads'::regclass")
+        )).scalar()
+        if not partitioned:
+            return
+        if not (await connection.execute(text(f"SELECT pg_try_advisory_lock({_ADVISORY_LOCK_ID})"))).scalar():
+            return
+        try:
+            created = await ensure_partitions(connection, today)
+            if created:
+                logging.info("Created lead partitions: %s", ", ".join(created))
+            expired = await apply_retention(connection, today)
+            if expired:
+                logging.info("Lead partitions past retention (%s): %s", LEAD_RETENTION_ACTION, ", ".join(expired))
+        finally:
+            await connection.execute(text(f"SELECT pg_advisory_unlock({_ADVISORY_LOCK_ID})"))
+
+
+async def maintain_forever(engine: AsyncEngine, interval: float = PARTITION_MAINTENANCE_INTERVAL):
+    """Runs `maintain` now and then every `interval` seconds; errors are logged and retried next time."""
+    while True:
+        try:
+            await maintain(engine)
+        except (DBAPIError, OSError) as e:
+            logging.error("Lead partition maintenance failed: %s", e)
+        await asyncio.sleep(interval)
@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import NamedTuple
+
+from fastapi.responses import JSONResponse
+
+# Token requests are a few hundred bytes; larger bodies are refused unread.
+MAX_BODY_BYTES = 4096
+# Under a flood every request is rejected, so rejections are logged as one
+# summary per this many seconds rather than one line each.
+REJECTION_LOG_INTERVAL = 60.0
+
+
+class RateLimit(NamedTuple):
+    requests: int
+    per_seconds: float
+
+    @property
+    def refill_rate(self) -> float:
+        return self.requests / self.per_seconds
+
+
+def parse_limit(value: str) -> RateLimit:
+    """Parses a limit written as "<requests>/<seconds>", e.g. "10/60"."""
+    requests, per_seconds = value.split("/")
+    return RateLimit(int(requests), float(per_seconds))
+
+
+def parse_overrides(value: str) -> dict[str, RateLimit]:
+    """Parses per-tenant limits written as "business_a=600/60,business_b=30/60"."""
+    overrides = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        business_id, limit = entry.rsplit("=", 1)
+        overrides[business_id.strip()] = parse_limit(limit)
+    return overrides
+
+
+class TokenBucketLimiter:
+    def __init__(self, max_keys: int = 100_000, shards: int = 16):
+        """
+        In-memory token buckets, one per key, spread over independently locked shards.
+        Each shard is an LRU map, so a check is O(1) and memory stays bounded: once a
+        shard is full, the least recently seen key is evicted. An evicted key simply
+        starts again with a full bucket.
+        """
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._max_keys_per_shard = max(1, max_keys // shards)
+
+    def check(self, key: str, limit: RateLimit) -> float:
+        """
+        Takes one token from the key's bucket.
+        Returns 0 if the request is allowed, otherwise the seconds until it would be.
+        """
+        index = zlib.crc32(key.encode()) % len(self._shards)
+        shard = self._shards[index]
+        now = time.monotonic()
+        with self._locks[index]:
+            bucket = shard.get(key)
+            if bucket is None:
+                bucket = shard[key] = [float(limit.requests), now]
+                if len(shard) > self._max_keys_per_shard:
+                    shard.popitem(last=False)
+            else:
+                shard.move_to_end(key)
+                tokens, last_seen = bucket
+                bucket[0] = min(float(limit.requests), tokens + (now - last_seen) * limit.refill_rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / limit.refill_rate
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app,
+        paths: set[str],
+        ip_limit: RateLimit,
+        business_limit: RateLimit,
+        business_overrides: dict[str, RateLimit] | None = None,
+        trusted_proxies: int = 0,
+        limiter: TokenBucketLimiter | None = None,
+    ):
+        """
+        ASGI middleware that rate limits the given paths per client IP and per
+        `business_id` (read from the JSON request body). Behind `trusted_proxies`
+        reverse proxies, the client IP is read from X-Forwarded-For.
+        """
+        self.app = app
+        self.paths = paths
+        self.ip_limit = ip_limit
+        self.business_limit = business_limit
+        self.business_overrides = business_overrides or {}
+        self.trusted_proxies = trusted_proxies
+        self.limiter = limiter or TokenBucketLimiter()
+        self._rejected = 0
+        self._rejections_logged_at = float("-inf")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        # The IP bucket is checked before anything is read from the client.
+        retry_after = self.limiter.check(f"ip:{self._client_ip(scope)}", self.ip_limit)
+        body = b""
+        if not retry_after:
+            # Buffer the body so we can read the business_id and still hand it to the endpoint.
+            chunks = []
+            size = 0
+            more_body = True
+            while more_body:
+                message = await receive()
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size > MAX_BODY_BYTES:
+                    response = JSONResponse({"detail": "Request body too large."}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                chunks.append(chunk)
+                more_body = message.get("more_body", False)
+            body = b"".join(chunks)
+
+            business_id = self._business_id(body)
+            if business_id is not None:
+                limit = self.business_overrides.get(business_id, self.business_limit)
+                retry_after = self.limiter.check(f"business:{business_id}", limit)
+
+        if retry_after:
+            self._log_rejection(scope)
+            response = JSONResponse(
+                {"detail": "Too many requests. Please try again shortly."},
+                status_code=429,
+                headers={"Retry-After": str(max(1, round(retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        async def replay_body():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, replay_body, send)
+
+    def _log_rejection(self, scope):
+        """Counts the rejection; logs the count (and the latest one) at most every REJECTION_LOG_INTERVAL."""
+        self._rejected += 1
+        now = time.monotonic()
+        if now - self._rejections_logged_at < REJECTION_LOG_INTERVAL:
+            return
+        logging.warning(
+            "Rate limit exceeded %s times since the last report, latest on %s for %s",
+            self._rejected, scope["path"], self._client_ip(scope),
+        )
+        self._rejected = 0
+        self._rejections_logged_at = now
+
+    def _client_ip(self, scope) -> str:
+        if self.trusted_proxies:
+            forwarded = [
+                address.strip()
+                for name, value in scope["headers"] if name == b"x-forwarded-for"
+                for address in value.decode("latin-1").split(",")
+            ]
+            if forwarded:
+                # Each proxy appends the address it received the request from, so
+                # only the last `trusted_proxies` entries can be trusted; anything
+                # further left was sent by the client.
+                return forwarded[-min(self.trusted_proxies, len(forwarded))]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    def _business_id(body: bytes) -> str | None:
+        try:
+            business_id = json.loads(body).get("business_id")
+        except (ValueError, AttributeError):
+            return None
+        return business_id if isinstance(business_id, str) else None
+
+
+def rate_limit_options_from_env() -> dict:
+    """Reads the token endpoint limits from the environment."""
+    return {
+        "ip_limit": parse_limit(os.getenv("TOKEN_RATE_LIMIT_PER_IP", "10/60")),
+        "business_limit": parse_limit(os.getenv("TOKEN_RATE_LIMIT_PER_BUSINESS", "300/60")),
+        "business_overrides": parse_overrides(os.getenv("TOKEN_RATE_LIMIT_OVERRIDES", "")),
+        # Reverse proxies in front of the server; RATE_LIMIT_TRUST_PROXY=true means one.
+        "trusted_proxies": int(os.getenv(
+            "RATE_LIMIT_TRUSTED_PROXIES",
+            "1" if os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true" else "0",
+        )),
+    }
@@ -0,0 +1,20 @@
+from collections.abc import Mapping
+
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.engine import Row
+
+from . import timing
+
+
+def row_response(row: Row | Mapping, status_code: int = 200) -> ORJSONResponse:
+    """
+    Serializes a database row straight to JSON with orjson.
+
+    Returning a Response makes FastAPI skip re-validating the payload against the
+    route's response_model, which is redundant for rows we just read from our own
+    tables and expensive for large knowledge bases. The response_model is still
+    used for the OpenAPI schema, so the row must only contain the model's columns.
+    """
+    content = dict(row._mapping) if isinstance(row, Row) else row
+    with timing.measure("serialize"):
+        return ORJSONResponse(content, status_code=status_code)
@@ -0,0 +1,74 @@
+import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import db
+from .models import lead_daily_stats, LeadDailyStats
+
+
+async def increment_lead_stats(
+    database: AsyncSession,
+    business_id: str,
+    day: datetime.date,
+    status: str,
+    delta: int = 1,
+):
+    """
+    Adjusts the rollup count for one business, day and status.
+    Must run in the same transaction as the lead write it accounts for.
+    """
+    query = db.dialect_insert(lead_daily_stats).values(
+        business_id=business_id, day=day, status=status, lead_count=delta
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[lead_daily_stats.c.business_id, lead_daily_stats.c.day, lead_daily_stats.c.status],
+        set_={"lead_count": lead_daily_stats.c.lead_count + query.excluded.lead_count},
+    )
+    await database.execute(query)
+
+
+async def adjust_lead_stats(
+    database: AsyncSession,
+    deltas: dict[tuple[str, datetime.date, str], int],
+):
+    """
+    Applies many (business_id, day, status) -> delta adjustments in a single
+    statement, for bulk lead writes. Must run in the same transaction as them.
+    """
+    if not deltas:
+        return
+    query = db.dialect_insert(lead_daily_stats).values([
+        {"business_id": business_id, "day": day, "status": status, "lead_count": delta}
+        for (business_id, day, status), delta in deltas.items()
+    ])
+    query = query.on_conflict_do_update(
+        index_elements=[lead_daily_stats.c.business_id, lead_daily_stats.c.day, lead_daily_stats.c.status],
+        set_={"lead_count": lead_daily_stats.c.lead_count + query.excluded.lead_count},
+    )
+    await database.execute(query)
+
+
+async def get_lead_stats(
+    database: AsyncSession,
+    business_id: str,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+) -> list[LeadDailyStats]:
+    """Reads the per-day lead counts for a business, oldest day first."""
+    query = select(lead_daily_stats).where(lead_daily_stats.c.business_id == business_id)
+    if start is not None:
+        query = query.where(lead_daily_stats.c.day >= start)
+    if end is not None:
+        query = query.where(lead_daily_stats.c.day <= end)
+    query = query.order_by(lead_daily_stats.c.day)
+
+    result = await database.execute(query)
+    days: dict[datetime.date, LeadDailyStats] = {}
+    for row in result:
+        stats = days.get(row.day)
+        if stats is None:
+            stats = days[row.day] = LeadDailyStats(day=row.day, total=0, by_status={})
+        stats.by_status[row.status] = row.lead_count
+        stats.total += row.lead_count
+    return list(days.values())
@@ -0,0 +1,194 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import time
+from collections import defaultdict
+
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from . import security
+
+# Phases of a request, in the order they are reported:
+#   db-pool   waiting for a database connection (and SQLite's writer queue)
+#   db-sql    executing SQL statements
+#   validate  parsing and validating the request and resolving dependencies
+#   serialize validating and encoding the response body
+#   total     everything up to the response headers
+PHASES = ("db-pool", "db-sql", "validate", "serialize", "total")
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+class RequestTimings:
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.endpoint_started = 0.0
+        self.endpoint_finished = 0.0
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] += seconds
+
+    def header(self) -> str:
+        return ", ".join(f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in self.phases.items())
+
+
+_current: contextvars.ContextVar[RequestTimings | None] = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextlib.contextmanager
+def measure(phase: str):
+    """Adds the time spent in the block to the current request's phase, if any."""
+    timings = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add(phase, time.perf_counter() - start)
+
+
+# --- SQL execution time, for every engine (primary and replicas) ---
+
+# The start time is kept on the statement's execution context rather than the
+# connection, so a statement that fails leaves nothing behind on pooled connections.
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _add_sql_time(context):
+    started = getattr(context, "_query_started", None)
+    timings = _current.get()
+    if started is not None and timings is not None:
+        timings.add("db-sql", time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _add_sql_time(context)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # Time spent on a statement that failed counts too.
+    if exception_context.execution_context is not None:
+        _add_sql_time(exception_context.execution_context)
+
+
+# --- Validation and serialization, around each route's handler ---
+
+class TimedRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kw):
+            timings = _current.get()
+            if timings is not None:
+                timings.endpoint_started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kw)
+            finally:
+                if timings is not None:
+                    timings.endpoint_finished = time.perf_counter()
+
+        super().__init__(path, timed_endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            timings = _current.get()
+            if timings is None:
+                return await handler(request)
+            started = time.perf_counter()
+            response = await handler(request)
+            # Everything before the endpoint ran, except waiting for a connection,
+            # is request validation and dependency resolution; everything after it
+            # is response validation and encoding.
+            timings.add("validate", max(0.0, timings.endpoint_started - started - timings.phases["db-pool"]))
+            timings.add("serialize", time.perf_counter() - timings.endpoint_finished)
+            return response
+
+        return timed_handler
+
+
+# --- Per-route histograms ---
+
+class Histograms:
+    def __init__(self):
+        # (route, phase) -> [bucket counts..., total count, sum in ms]
+        self._data = defaultdict(lambda: [0] * len(BUCKETS_MS) + [0, 0.0])
+
+    def observe(self, route: str, timings: RequestTimings):
+        for phase, seconds in timings.phases.items():
+            milliseconds = seconds * 1000
+            data = self._data[(route, phase)]
+            data[bisect.bisect_left(BUCKETS_MS, milliseconds)] += 1
+            data[-2] += 1
+            data[-1] += milliseconds
+
+    def snapshot(self) -> dict:
+        routes = defaultdict(dict)
+        for (route, phase), data in list(self._data.items()):
+            routes[route][phase] = {
+                "count": data[-2],
+                "sum_ms": round(data[-1], 3),
+                # Cumulative counts per upper bound, as in Prometheus histograms
+                "buckets": {
+                    ("+Inf" if bound == float("inf") else str(bound)): count
+                    for bound, count in zip(BUCKETS_MS, _cumulative(data[:len(BUCKETS_MS)]))
+                },
+            }
+        return routes
+
+
+def _cumulative(counts):
+    total = 0
+    for count in counts:
+        total += count
+        yield total
+
+
+histograms = Histograms()
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app):
+        """Times every HTTP request, reports the phases in a Server-Timing header and records them per route."""
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings.add("total", time.perf_counter() - started)
+                MutableHeaders(scope=message).append("Server-Timing", timings.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            histograms.observe(f"{scope['method']} {route.path if route else 'unmatched'}", timings)
+
+
+router = APIRouter()
+
+@router.get("/api/internal/metrics/timings", dependencies=[Depends(security.get_api_key)])
+async def get_timing_metrics():
+    """Per-route histograms of the time spent in each phase of a request."""
+    return histograms.snapshot()
@@ -0,0 +1,233 @@
+"""
+Load generator for the cloud backend API.
+
+Drives a weighted mix of traffic against /api/token, /api/internal/businesses/{id}
+and /api/internal/leads at a fixed arrival rate (open loop) with a cap on requests
+in flight, then reports throughput and p50/p95/p99 latency per route. Latency is
+measured from each request's scheduled start, so a backend that falls behind shows
+up as queueing time instead of silently lowering the offered load.
+
+Run from apps/cloud/backend, either against the app in-process:
+    python -m benchmarks.loadtest --rate 200 --duration 30
+(set DATABASE_URL=sqlite+aiosqlite:///./loadtest.db to use an embedded database instead
+of a PostgreSQL server), or against a running server:
+    uvicorn main:app --port 8000
+    python -m benchmarks.loadtest --base-url http://localhost:8000 --api-key $INTERNAL_API_KEY
+
+Use --save-baseline to record a run, and --baseline to fail (exit code 1) when a
+later run regresses against it by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+import httpx
+
+ROUTES = ("token", "business", "lead")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "loadtest.json")
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """Parses route weights written as "token=5,business=10,lead=1"."""
+    mix = {}
+    for entry in value.split(","):
+        route, weight = entry.split("=")
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"Unknown route '{route}', expected one of {', '.join(ROUTES)}")
+        mix[route] = float(weight)
+    return mix
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, api_key: str, business_id: str):
+        self.client = client
+        self.headers = {"Authorization": api_key}
+        self.business_id = business_id
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+
+    async def ensure_business(self):
+        """Creates the business the traffic targets if it does not exist yet."""
+        response = await self.client.get(f"/api/internal/businesses/{self.business_id}", headers=self.headers)
+        if response.status_code == 404:
+            response = await self.client.post(
+                "/api/internal/businesses",
+                headers=self.headers,
+                json={
+                    "id": self.business_id,
+                    "business_name": "Load Test Plumbing",
+                    "knowledge_base": "We fix leaky pipes. Open 8am to 6pm, Monday to Saturday. " * 50,
+                },
+            )
+        response.raise_for_status()
+
+    def request(self, route: str):
+        if route == "token":
+            room_name = f"{self.business_id}_{uuid.uuid4().hex}"
+            return self.client.post("/api/token", json={"business_id": self.business_id, "room_name": room_name})
+        if route == "business":
+            return self.client.get(f"/api/internal/businesses/{self.business_id}", headers=self.headers)
+        return self.client.post(
+            "/api/internal/leads",
+            headers=self.headers,
+            json={
+                "business_id": self.business_id,
+                "visitor_name": "Load Test",
+                "visitor_email": "loadtest@example.com",
+                "inquiry": "Quote for a leaky pipe under the kitchen sink",
+            },
+        )
+
+    async def _send(self, route: str, scheduled_at: float, in_flight: asyncio.Semaphore):
+        async with in_flight:
+            try:
+                response = await self.request(route)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+        if ok:
+            self.latencies[route].append(time.perf_counter() - scheduled_at)
+        else:
+            self.errors[route] += 1
+
+    async def run(self, mix: dict[str, float], rate: float, concurrency: int, duration: float) -> float:
+        """Offers `rate` requests per second for `duration` seconds. Returns the elapsed time."""
+        in_flight = asyncio.Semaphore(concurrency)
+        routes, weights = zip(*mix.items())
+        tasks = []
+        start = time.perf_counter()
+        for n in range(int(rate * duration)):
+            scheduled_at = start + n / rate
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            route = random.choices(routes, weights)[0]
+            tasks.append(asyncio.create_task(self._send(route, scheduled_at, in_flight)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> dict:
+        results = {}
+        for route in ROUTES:
+            latencies = sorted(self.latencies[route])
+            total = len(latencies) + self.errors[route]
+            if not total:
+                continue
+            results[route] = {
+                "requests": total,
+                "errors": self.errors[route],
+                "throughput": len(latencies) / elapsed,
+                "p50_ms": percentile(latencies, 0.50) * 1000,
+                "p95_ms": percentile(latencies, 0.95) * 1000,
+                "p99_ms": percentile(latencies, 0.99) * 1000,
+            }
+        return results
+
+
+def print_report(results: dict):
+    print(f"{'route':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, r in results.items():
+        print(
+            f"{route:<10} {r['requests']:>9} {r['errors']:>7} {r['throughput']:>9.1f} "
+            f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}"
+        )
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Compares a run against a stored baseline and describes every regression found."""
+    regressions = []
+    for route, base in baseline.items():
+        current = results.get(route)
+        if current is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{route} {metric}: {current[metric]:.1f} > baseline {base[metric]:.1f}")
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{route} throughput: {current['throughput']:.1f} < baseline {base['throughput']:.1f}")
+        if current["errors"] / current["requests"] > base["errors"] / base["requests"] + 0.01:
+            regressions.append(f"{route} error rate: {current['errors']}/{current['requests']} requests failed")
+    return regressions
+
+
+def in_process_client() -> httpx.AsyncClient:
+    """Builds a client that calls the FastAPI app directly, without a network hop."""
+    # The app reads these at import time; give a local run working defaults and
+    # lift the token rate limit, since every request comes from the same client.
+    os.environ.setdefault("INTERNAL_API_KEY", "loadtest-key")
+    os.environ.setdefault("LIVEKIT_API_KEY", "loadtest-key")
+    os.environ.setdefault("LIVEKIT_API_SECRET", "loadtest-secret-loadtest-secret-loadtest")
+    os.environ.setdefault("TOKEN_RATE_LIMIT_PER_IP", "1000000/1")
+    os.environ.setdefault("TOKEN_RATE_LIMIT_PER_BUSINESS", "1000000/1")
+    from main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest")
+
+
+async def main(args) -> int:
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        client = in_process_client()
+        # The ASGI transport does not run the app's lifespan, so create the schema here.
+        from app import db
+        await db.init_db()
+    api_key = args.api_key or os.getenv("INTERNAL_API_KEY", "")
+
+    async with client:
+        load_test = LoadTest(client, api_key, args.business_id)
+        await load_test.ensure_business()
+        elapsed = await load_test.run(args.mix, args.rate, args.concurrency, args.duration)
+
+    if not args.base_url:
+        await db.dispose_engines()
+
+    results = load_test.report(elapsed)
+    print_report(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Target a running server instead of the in-process app.")
+    parser.add_argument("--api-key", help="Internal API key (defaults to INTERNAL_API_KEY).")
+    parser.add_argument("--business-id", default="loadtest-business")
+    parser.add_argument("--rate", type=float, default=50.0, help="Requests offered per second.")
+    parser.add_argument("--concurrency", type=int, default=50, help="Maximum requests in flight.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of traffic to offer.")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("token=5,business=10,lead=1"))
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression.")
+    sys.exit(asyncio.run(main(parser.parse_args())))
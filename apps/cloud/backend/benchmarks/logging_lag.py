@@ -0,0 +1,100 @@
+"""
+Event loop lag caused by logging, before and after the queued logging pipeline,
+with the effect of sampling and of queueing measured apart and together.
+
+Logs a lead-sized payload at INFO --rate times per second for --duration seconds
+while app.logs.EventLoopLagMonitor measures how late the event loop wakes up:
+  * "direct": an f-string formatted eagerly and written by a StreamHandler on the
+    event loop (the previous setup),
+  * "sampled": lazy %-formatting and JSON, written on the event loop, but only
+    for the records app.logs.SamplingFilter keeps (logs.SAMPLED),
+  * "queued": lazy %-formatting and JSON, every record written by the background
+    thread installed by app.logs.setup_logging(),
+  * "queued+sampled": both, as the backend logs each lead.
+Use --sink-latency-ms to simulate a slow log destination (a full pipe to the
+container runtime, a network volume), which is where blocking writes hurt.
+
+Run from apps/cloud/backend:
+    python -m benchmarks.logging_lag --rate 500 --sink-latency-ms 1
+"""
+import argparse
+import asyncio
+import io
+import logging
+import time
+
+from app import logs
+
+PAYLOAD = {
+    "business_id": "loadtest-business",
+    "visitor_name": "Load Test",
+    "visitor_email": "loadtest@example.com",
+    "visitor_phone": "555-0100",
+    "inquiry": "Quote for a leaky pipe under the kitchen sink. " * 5,
+}
+
+MODES = ("direct", "sampled", "queued", "queued+sampled")
+
+
+class SlowSink(io.StringIO):
+    """A log destination whose writes take `latency` seconds."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def write(self, text: str) -> int:
+        if self.latency:
+            time.sleep(self.latency)
+        return super().write(text)
+
+
+async def run(mode: str, rate: float, duration: float, sink_latency: float) -> dict:
+    sink = SlowSink(sink_latency)
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    queued = mode.startswith("queued")
+    if queued:
+        handler = logs.setup_logging(level="INFO", json_format=True, stream=sink)
+    else:
+        handler = logging.StreamHandler(sink)
+        if mode == "direct":
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        else:
+            handler.setFormatter(logs.JSONFormatter())
+            handler.addFilter(logs.SamplingFilter())
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    sampled = {"extra": logs.SAMPLED} if mode.endswith("sampled") else {}
+
+    monitor = logs.EventLoopLagMonitor(interval=0.01, report_every=float("inf"))
+    monitor.start()
+    start = time.perf_counter()
+    for n in range(int(rate * duration)):
+        # Always yield, as a request or RPC handler would between log calls.
+        await asyncio.sleep(max(0.0, start + n / rate - time.perf_counter()))
+        if mode == "direct":
+            logging.info(f"Received request to create lead: {dict(PAYLOAD)}")
+        else:
+            logging.info("Received request to create lead: %s", PAYLOAD, **sampled)
+    await monitor.stop()
+    if queued:
+        # Let the writer thread catch up, so it does not compete with the next mode.
+        await asyncio.to_thread(handler.queue.join)
+    return monitor.snapshot()
+
+
+def main(args):
+    print(f"{'mode':<15} {'samples':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode in MODES:
+        result = asyncio.run(run(mode, args.rate, args.duration, args.sink_latency_ms / 1000))
+        print(f"{mode:<15} {result['samples']:>8} " + " ".join(f"{result.get(key, '-'):>8}" for key in ("p50_ms", "p99_ms", "max_ms")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=500.0, help="Log records per second.")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--sink-latency-ms", type=float, default=1.0, help="Simulated time per write to the log destination.")
+    main(parser.parse_args())
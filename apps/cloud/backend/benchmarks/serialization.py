@@ -0,0 +1,65 @@
+"""
+Microbenchmark: serialization cost per request for business profile responses.
+
+Compares the default FastAPI path (validate the row against the response_model,
+dump it to JSON-compatible data, then json.dumps) with the trusted orjson path
+used by app.responses.row_response, for a range of knowledge base sizes.
+
+Run from apps/cloud/backend:
+    python -m benchmarks.serialization
+"""
+import datetime
+import json
+import timeit
+
+import orjson
+
+from app.models import Business
+
+KNOWLEDGE_BASE_SIZES = [0, 2_000, 64_000, 1_000_000]
+
+
+def make_row(knowledge_base_size: int) -> dict:
+    sentence = "We fix leaky pipes, water heaters and drains. Open 8am to 6pm, Monday to Saturday. "
+    knowledge_base = (sentence * (knowledge_base_size // len(sentence) + 1))[:knowledge_base_size]
+    return {
+        "id": "acme-plumbing",
+        "business_name": "Acme Plumbing",
+        "contact_name": "Jane Doe",
+        "phone_number": "555-0100",
+        "email": "jane@acme.example",
+        "knowledge_base": knowledge_base,
+        "created_at": datetime.datetime(2025, 8, 11, 19, 57, 18, 177157),
+    }
+
+
+def validated_json(row: dict) -> bytes:
+    """What FastAPI does for a route with response_model=Business and the default JSONResponse."""
+    content = Business.model_validate(row).model_dump(mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def trusted_json(row: dict) -> bytes:
+    """What app.responses.row_response does."""
+    return orjson.dumps(row, option=orjson.OPT_NON_STR_KEYS)
+
+
+def per_call_microseconds(function, row: dict) -> float:
+    timer = timeit.Timer(lambda: function(row))
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=number))
+    return best / number * 1_000_000
+
+
+def main():
+    print(f"{'knowledge base':>15} {'validated (us)':>15} {'orjson (us)':>12} {'speedup':>8}")
+    for size in KNOWLEDGE_BASE_SIZES:
+        row = make_row(size)
+        assert json.loads(validated_json(row)) == json.loads(trusted_json(row))
+        validated = per_call_microseconds(validated_json, row)
+        trusted = per_call_microseconds(trusted_json, row)
+        print(f"{size:>14,}B {validated:>15.1f} {trusted:>12.1f} {validated / trusted:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
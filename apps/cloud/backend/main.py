@@ -1,8 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app import api
+from app import api, db, events, logs, partitions, ratelimit, timing
+
+# Log records are written by a background thread, never on the event loop.
+logs.setup_logging()
 
-app = FastAPI(title="Contractor Leads Bot API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Creates the schema when running on an embedded SQLite database
+    await db.init_db()
+    loop_lag = logs.EventLoopLagMonitor()
+    loop_lag.start()
+    # Creates upcoming monthly lead partitions and applies the retention policy
+    partition_maintenance = None if db.IS_SQLITE else asyncio.create_task(partitions.maintain_forever(db.engine))
+    # Feeds the lead event streams from Postgres notifications
+    lead_events = None if db.IS_SQLITE else asyncio.create_task(events.listen_forever(db.engine))
+    yield
+    if lead_events is not None:
+        lead_events.cancel()
+        await asyncio.gather(lead_events, return_exceptions=True)
+    if partition_maintenance is not None:
+        partition_maintenance.cancel()
+        await asyncio.gather(partition_maintenance, return_exceptions=True)
+    await loop_lag.stop()
+    if api.early_dispatcher is not None:
+        await api.early_dispatcher.aclose()
+    await db.dispose_engines()
+
+app = FastAPI(title="Contractor Leads Bot API", lifespan=lifespan)
 
 # Define the origins that are allowed to make requests to this server.
 # For development, we'll allow our local React server.
@@ -11,6 +39,14 @@ origins = [
     "http://localhost:3000",
 ]
 
+# Every token can start an agent job, so limit how fast they can be minted.
+# Added before CORS so that rejected requests still carry CORS headers.
+app.add_middleware(
+    ratelimit.RateLimitMiddleware,
+    paths={"/api/token"},
+    **ratelimit.rate_limit_options_from_env(),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -19,8 +55,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the reported total covers every other middleware too
+app.add_middleware(timing.ServerTimingMiddleware)
+
 # Include the router from our api module
 app.include_router(api.router)
+app.include_router(timing.router)
 
 @app.get("/")
 async def read_root():
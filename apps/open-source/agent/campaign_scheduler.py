@@ -0,0 +1,299 @@
+"""
+Outbound call campaign scheduler.
+
+Reads a call list (CSV with `phone_number`, `name` and `persona` columns) and, for
+each entry, creates a LiveKit room named after the persona (so the agent picks the
+Newport or Devin instructions), dispatches the agent and dials the number through
+a SIP outbound trunk.
+
+Calls are paced so workers and providers are never overloaded:
+  * at most --max-concurrent calls of this campaign are in flight,
+  * the jobs running on the agent workers stay below --worker-capacity, re-read
+    on every tick so other campaigns and inbound calls are taken into account.
+    With --worker-status-urls (each worker's HTTP server, port 8081 by default)
+    the active jobs are read from the workers themselves; otherwise they are
+    estimated as the number of rooms on the LiveKit project, one job each.
+    Neither reports how many jobs the workers could still take, so the
+    capacity itself is a setting, sized to what the workers run below their
+    load_threshold,
+  * calls are started no faster than --calls-per-hour.
+
+Unanswered calls are retried up to --max-attempts times, --retry-delay seconds
+apart. Progress is checkpointed to a JSON file after every change, so an
+interrupted campaign resumes where it left off when started again.
+
+Usage:
+    python campaign_scheduler.py calls.csv --campaign-id spring-confirmations \
+        --max-concurrent 20 --worker-capacity 100 --calls-per-hour 3000
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+
+import aiohttp
+from dotenv import load_dotenv
+from livekit import api
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PENDING, IN_PROGRESS, COMPLETED, NO_ANSWER = "pending", "in_progress", "completed", "no_answer"
+
+# What a LiveKit API call raises when it fails: an error response, or no
+# response at all (connection refused or reset, or a timeout).
+API_ERRORS = (api.TwirpError, aiohttp.ClientError, asyncio.TimeoutError)
+WORKER_STATUS_TIMEOUT = aiohttp.ClientTimeout(total=2)
+
+
+@dataclass
+class CallTarget:
+    index: int
+    phone_number: str
+    name: str
+    persona: str
+    status: str = PENDING
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+    room_name: str | None = None
+
+
+def load_call_list(path: str) -> list[CallTarget]:
+    with open(path, newline="") as f:
+        return [
+            CallTarget(index=i, phone_number=row["phone_number"], name=row.get("name", ""), persona=row.get("persona", "newport"))
+            for i, row in enumerate(csv.DictReader(f))
+        ]
+
+
+class CampaignScheduler:
+    def __init__(
+        self,
+        lkapi: api.LiveKitAPI,
+        campaign_id: str,
+        targets: list[CallTarget],
+        checkpoint_path: str,
+        max_concurrent: int,
+        worker_capacity: int,
+        calls_per_hour: float,
+        max_attempts: int,
+        retry_delay: float,
+        sip_trunk_id: str | None,
+        agent_name: str | None = None,
+        worker_status_urls: list[str] | None = None,
+        poll_interval: float = 2.0,
+    ):
+        self.lkapi = lkapi
+        self.campaign_id = campaign_id
+        self.targets = targets
+        self.checkpoint_path = checkpoint_path
+        self.max_concurrent = max_concurrent
+        self.worker_capacity = worker_capacity
+        self.start_interval = 3600.0 / calls_per_hour
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.sip_trunk_id = sip_trunk_id
+        self.agent_name = agent_name
+        self.worker_status_urls = worker_status_urls or []
+        self.poll_interval = poll_interval
+        self._next_start_at = 0.0
+        # Jobs on the workers at the last successful refresh
+        self._active_jobs = 0
+        self._http: aiohttp.ClientSession | None = None
+        # Dialing tasks, kept so they are not garbage-collected mid-call
+        self._dialing: set[asyncio.Task] = set()
+
+    def load_checkpoint(self):
+        """Restores the progress of a previous run of this campaign, if any."""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path) as f:
+            saved = {entry["index"]: entry for entry in json.load(f)["targets"]}
+        for target in self.targets:
+            if target.index in saved:
+                for field, value in saved[target.index].items():
+                    setattr(target, field, value)
+        logging.info(f"Resumed campaign {self.campaign_id} from {self.checkpoint_path}")
+
+    def save_checkpoint(self):
+        # Write to a temporary file and rename, so a crash never leaves a torn checkpoint.
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"campaign_id": self.campaign_id, "targets": [asdict(t) for t in self.targets]}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def progress(self) -> dict[str, int]:
+        counts = dict.fromkeys((PENDING, IN_PROGRESS, COMPLETED, NO_ANSWER), 0)
+        for target in self.targets:
+            counts[target.status] += 1
+        return counts
+
+    async def run(self):
+        self.load_checkpoint()
+        while True:
+            active_jobs = await self._refresh_active_calls()
+            in_flight = [t for t in self.targets if t.status == IN_PROGRESS]
+            due = [t for t in self.targets if t.status == PENDING and t.next_attempt_at <= time.time()]
+            if not in_flight and not any(t.status == PENDING for t in self.targets):
+                break
+
+            # Free slots are bounded by both the campaign's own cap and what the workers can take.
+            free_slots = min(self.max_concurrent - len(in_flight), self.worker_capacity - active_jobs)
+            for target in due[:max(0, free_slots)]:
+                wait = self._next_start_at - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._next_start_at = time.monotonic() + self.start_interval
+                await self._start_call(target)
+
+            self.save_checkpoint()
+            logging.info(f"Campaign {self.campaign_id} progress: {self.progress()}, active jobs: {active_jobs}")
+            await asyncio.sleep(self.poll_interval)
+
+        await asyncio.gather(*self._dialing)
+        self.save_checkpoint()
+        logging.info(f"Campaign {self.campaign_id} finished: {self.progress()}")
+
+    async def _refresh_active_calls(self) -> int:
+        """
+        Marks calls whose room has closed as completed and returns the number of
+        jobs on the workers. If LiveKit cannot be reached, this tick marks
+        nothing and the last count is reused.
+        """
+        try:
+            rooms = (await self.lkapi.room.list_rooms(api.ListRoomsRequest())).rooms
+        except API_ERRORS as e:
+            logging.warning(f"Could not list rooms, reusing the last count of {self._active_jobs} active jobs: {_describe(e)}")
+            return self._active_jobs
+        open_rooms = {room.name for room in rooms}
+        for target in self.targets:
+            if target.status == IN_PROGRESS and target.room_name not in open_rooms and not self._is_dialing(target):
+                target.status = COMPLETED
+        worker_jobs = await self._worker_jobs() if self.worker_status_urls else None
+        self._active_jobs = len(rooms) if worker_jobs is None else worker_jobs
+        return self._active_jobs
+
+    async def _worker_jobs(self) -> int | None:
+        """Sum of the active jobs the workers report on their /worker endpoint; None if one cannot be read."""
+        if self._http is None:
+            self._http = aiohttp.ClientSession(timeout=WORKER_STATUS_TIMEOUT)
+
+        async def active_jobs(url: str) -> int:
+            async with self._http.get(f"{url.rstrip('/')}/worker") as response:
+                response.raise_for_status()
+                return int((await response.json(content_type=None))["active_jobs"])
+
+        try:
+            return sum(await asyncio.gather(*(active_jobs(url) for url in self.worker_status_urls)))
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+            logging.warning(f"Could not read the workers' load, counting rooms instead: {e!r}")
+            return None
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.close()
+
+    def _is_dialing(self, target: CallTarget) -> bool:
+        return any(task.get_name() == target.room_name for task in self._dialing)
+
+    async def _start_call(self, target: CallTarget):
+        target.attempts += 1
+        target.status = IN_PROGRESS
+        # The agent chooses its persona from the room name, e.g. "newport_...".
+        target.room_name = f"{target.persona}_{self.campaign_id}_{target.index}_{target.attempts}"
+        metadata = json.dumps({"campaign_id": self.campaign_id, "name": target.name})
+
+        try:
+            await self.lkapi.room.create_room(api.CreateRoomRequest(name=target.room_name, empty_timeout=30, metadata=metadata))
+            if self.agent_name:
+                await self.lkapi.agent_dispatch.create_dispatch(
+                    api.CreateAgentDispatchRequest(agent_name=self.agent_name, room=target.room_name, metadata=metadata)
+                )
+        except API_ERRORS as e:
+            logging.error(f"Could not set up room {target.room_name}: {_describe(e)}")
+            self._schedule_retry(target)
+            return
+
+        if self.sip_trunk_id:
+            task = asyncio.create_task(self._dial(target), name=target.room_name)
+            self._dialing.add(task)
+            task.add_done_callback(self._dialing.discard)
+
+    async def _dial(self, target: CallTarget):
+        try:
+            await self.lkapi.sip.create_sip_participant(api.CreateSIPParticipantRequest(
+                sip_trunk_id=self.sip_trunk_id,
+                sip_call_to=target.phone_number,
+                room_name=target.room_name,
+                participant_identity=f"callee-{target.index}",
+                participant_name=target.name,
+                wait_until_answered=True,
+            ))
+            logging.info(f"Call {target.room_name} answered.")
+        except API_ERRORS as e:
+            logging.info(f"Call {target.room_name} not answered: {_describe(e)}")
+            # Rescheduled first: if deleting the room fails too, the call must not
+            # stay in progress and be counted as completed once the room times out.
+            self._schedule_retry(target)
+            try:
+                await self.lkapi.room.delete_room(api.DeleteRoomRequest(room=target.room_name))
+            except API_ERRORS as e:
+                logging.warning(f"Could not delete room {target.room_name}, it closes when empty: {_describe(e)}")
+        self.save_checkpoint()
+
+    def _schedule_retry(self, target: CallTarget):
+        if target.attempts >= self.max_attempts:
+            target.status = NO_ANSWER
+        else:
+            target.status = PENDING
+            target.next_attempt_at = time.time() + self.retry_delay
+
+
+def _describe(error: Exception) -> str:
+    return error.message if isinstance(error, api.TwirpError) else repr(error)
+
+
+async def main(args):
+    lkapi = api.LiveKitAPI(os.getenv("LIVEKIT_URL"), os.getenv("LIVEKIT_API_KEY"), os.getenv("LIVEKIT_API_SECRET"))
+    scheduler = CampaignScheduler(
+        lkapi,
+        campaign_id=args.campaign_id,
+        targets=load_call_list(args.call_list),
+        checkpoint_path=args.checkpoint or f"{args.campaign_id}.checkpoint.json",
+        max_concurrent=args.max_concurrent,
+        worker_capacity=args.worker_capacity,
+        calls_per_hour=args.calls_per_hour,
+        max_attempts=args.max_attempts,
+        retry_delay=args.retry_delay,
+        sip_trunk_id=os.getenv("SIP_OUTBOUND_TRUNK_ID"),
+        agent_name=args.agent_name,
+        worker_status_urls=[url.strip() for url in (args.worker_status_urls or "").split(",") if url.strip()],
+    )
+    try:
+        await scheduler.run()
+    finally:
+        await scheduler.aclose()
+        await lkapi.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("call_list", help="CSV file with phone_number, name and persona columns.")
+    parser.add_argument("--campaign-id", required=True)
+    parser.add_argument("--checkpoint", help="Progress file (defaults to <campaign-id>.checkpoint.json).")
+    parser.add_argument("--max-concurrent", type=int, default=10, help="Calls of this campaign in flight at once.")
+    parser.add_argument("--worker-capacity", type=int, default=50, help="Total jobs the agent workers can run at once.")
+    parser.add_argument(
+        "--worker-status-urls",
+        help="Comma-separated HTTP addresses of the agent workers (e.g. http://agent-1:8081), to read their active jobs from.",
+    )
+    parser.add_argument("--calls-per-hour", type=float, default=1000)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--retry-delay", type=float, default=900, help="Seconds before redialing an unanswered call.")
+    parser.add_argument("--agent-name", help="Dispatch this named agent explicitly instead of relying on automatic dispatch.")
+    asyncio.run(main(parser.parse_args()))
@@ -3,16 +3,60 @@ import json
 from livekit import agents, rtc
 from livekit.agents import function_tool, get_job_context
 
+from answer_cache import BusinessAnswerCache
+from llm_router import LLMRouter
+from logs import SAMPLED
+
 class BusinessAgent(agents.Agent):
-    def __init__(self, instructions: str):
+    def __init__(
+        self,
+        instructions: str,
+        llm_router: LLMRouter | None = None,
+        answer_cache: BusinessAnswerCache | None = None,
+    ):
         """
         Initializes the BusinessAgent.
         This agent is now generic and receives its full instructions upon creation.
         It does not know how the instructions were created, only that it must follow them.
+        With an `llm_router`, each turn is answered by the model the router picks
+        instead of the session's LLM. With an `answer_cache`, repeat questions are
+        answered from earlier answers without calling the LLM at all.
         """
         super().__init__(instructions=instructions)
         # This flag tracks if the form is active on the user's screen
         self._is_form_displayed = False
+        self._llm_router = llm_router
+        self._answer_cache = answer_cache
+
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        caller_turns = [
+            item.text_content or "" for item in chat_ctx.items if item.type == "message" and item.role == "user"
+        ]
+        question = caller_turns[-1] if caller_turns else ""
+        use_cache = self._answer_cache is not None and not self._is_form_displayed
+        if use_cache:
+            answer = self._answer_cache.lookup(question)
+            if answer is not None:
+                yield answer
+                return
+
+        answer_parts = []
+        called_tool = False
+        async for chunk in self._generate(chat_ctx, tools, model_settings):
+            if isinstance(chunk, str):
+                answer_parts.append(chunk)
+            elif chunk.delta is not None:
+                answer_parts.append(chunk.delta.content or "")
+                called_tool = called_tool or bool(chunk.delta.tool_calls)
+            yield chunk
+        # Only complete, plain answers are reused; turns that called a tool depend on the caller.
+        if use_cache and not called_tool:
+            self._answer_cache.store(question, "".join(answer_parts), caller_turns)
+
+    def _generate(self, chat_ctx, tools, model_settings):
+        if self._llm_router is None:
+            return agents.Agent.default.llm_node(self, chat_ctx, tools, model_settings)
+        return self._llm_router.chat(chat_ctx, tools, model_settings.tool_choice, self._is_form_displayed)
 
     @function_tool()
     async def present_verification_form(self, name: str, inquiry: str, email: str, phone: str | None = None):
@@ -28,7 +72,10 @@ class BusinessAgent(agents.Agent):
             phone (str, optional): The users phone number. This is optional.
        
         """
-        logging.info(f"LLM triggered present_verification_form with: name='{name}', inquiry='{inquiry}', email='{email}', phone='{phone}'")
+        logging.info(
+            "LLM triggered present_verification_form with: name='%s', inquiry='%s', email='%s', phone='%s'",
+            name, inquiry, email, phone, extra=SAMPLED,
+        )
 
         ctx = get_job_context()
         room = ctx.room
@@ -52,7 +99,7 @@ class BusinessAgent(agents.Agent):
                 method="display_lead_form",
                 payload=json.dumps(payload)
             )
-            logging.info(f"Successfully sent RPC to {visitor_participant.identity}")
+            logging.info("Successfully sent RPC to %s", visitor_participant.identity)
             self._is_form_displayed = True # Set the flag to True
             return "The verification form was successfully displayed to the user."
         except Exception as e:
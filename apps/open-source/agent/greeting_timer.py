@@ -0,0 +1,54 @@
+import datetime
+import json
+import logging
+import time
+
+
+class GreetingTimer:
+    def __init__(self, room_metadata: str):
+        """
+        Timeline of how fast a job greets the visitor, relative to the job start.
+        Rooms created when the token was minted (early dispatch) carry the
+        business_id and the dispatch time in their metadata; any other room was
+        created by the visitor joining it.
+        """
+        self._started = time.monotonic()
+        self._started_at = time.time()
+        self.marks: dict[str, float] = {}
+        try:
+            metadata = json.loads(room_metadata or "{}")
+        except ValueError:
+            metadata = {}
+        self.business_id = metadata.get("business_id")
+        dispatched_at = metadata.get("dispatched_at")
+        self.early_dispatch = dispatched_at is not None
+        # Wall-clock time from the token being minted to this job starting
+        self.token_to_job_ms = round((time.time() - dispatched_at) * 1000) if self.early_dispatch else None
+        # Wall-clock time the visitor's wait starts at: the token being minted
+        # with early dispatch, otherwise set by room_created once connected.
+        self.visitor_arrived_at = dispatched_at
+
+    def room_created(self, created_at: datetime.datetime):
+        """
+        Takes the room's creation time (Room.creation_time, once connected). A
+        room not created at token-mint time was created by the visitor joining
+        it, so that is when their wait started.
+        """
+        if not self.early_dispatch and created_at.timestamp() > 0:
+            self.visitor_arrived_at = created_at.timestamp()
+
+    def mark(self, event: str):
+        """Records the first time `event` happens, e.g. "agent_ready", "visitor_audio", "greeting"."""
+        self.marks.setdefault(event, time.monotonic())
+
+    def report(self):
+        report = {
+            "dispatch": "early" if self.early_dispatch else "on-join",
+            "token_to_job_ms": self.token_to_job_ms,
+            **{f"{event}_ms": round((at - self._started) * 1000) for event, at in self.marks.items()},
+        }
+        # What the visitor experiences: from joining (or requesting their token) to the greeting starting
+        if self.visitor_arrived_at is not None and "greeting" in self.marks:
+            greeting_at = self._started_at + self.marks["greeting"] - self._started
+            report["time_to_greeting_ms"] = round((greeting_at - self.visitor_arrived_at) * 1000)
+        logging.info("Time to greeting: %s", report, extra={"greeting_timing": report})
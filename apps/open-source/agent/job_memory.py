@@ -0,0 +1,96 @@
+import asyncio
+import gc
+import logging
+import os
+import tracemalloc
+
+import psutil
+
+MB = 1024 * 1024
+
+
+class JobMemoryProfiler:
+    def __init__(self, sample_interval: float = 1.0, top: int = 10):
+        """
+        Memory accounting for the jobs a worker process runs one after another.
+
+        Always on: the process RSS is sampled every `sample_interval` seconds while
+        a job runs, and its high-water mark is reported when the job ends, to size
+        job processes.
+
+        Opt-in (MEMORY_PROFILING=true): tracemalloc traces allocations, and at the
+        start of every job, after a full garbage collection, the heap is compared
+        with the start of the previous job. Whatever the previous job left behind
+        (room handlers, RPC handlers, sessions) shows up as the top growing
+        allocation sites.
+        """
+        self.sample_interval = sample_interval
+        self.top = top
+        self.tracing = os.getenv("MEMORY_PROFILING", "false").lower() == "true"
+        if self.tracing and not tracemalloc.is_tracing():
+            tracemalloc.start(int(os.getenv("MEMORY_PROFILING_FRAMES", "5")))
+        self._process = psutil.Process()
+        self._first_rss = None
+        self._previous_snapshot = None
+        self._job_id = None
+        self._rss_start = 0
+        self._rss_peak = 0
+        self._sampler = None
+        self.jobs = 0
+
+    def start_job(self, job_id: str):
+        """Call first thing in the entrypoint."""
+        self.jobs += 1
+        self._job_id = job_id
+        if self.tracing:
+            gc.collect()
+            self._report_retained()
+            tracemalloc.reset_peak()
+        self._rss_start = self._rss_peak = self._process.memory_info().rss
+        if self._first_rss is None:
+            self._first_rss = self._rss_start
+        self._sampler = asyncio.get_running_loop().create_task(self._sample())
+
+    async def end_job(self):
+        """Call when the job shuts down; logs the job's memory report."""
+        if self._sampler is None:
+            return
+        self._sampler.cancel()
+        await asyncio.gather(self._sampler, return_exceptions=True)
+        self._sampler = None
+
+        rss_end = self._process.memory_info().rss
+        self._rss_peak = max(self._rss_peak, rss_end)
+        report = {
+            "job_id": self._job_id,
+            "jobs_in_process": self.jobs,
+            "rss_start_mb": round(self._rss_start / MB, 1),
+            "rss_end_mb": round(rss_end / MB, 1),
+            "rss_peak_mb": round(self._rss_peak / MB, 1),
+            "rss_growth_since_first_job_mb": round((rss_end - self._first_rss) / MB, 1),
+        }
+        if self.tracing:
+            report["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / MB, 1)
+        logging.info("Job memory: %s", report, extra={"job_memory": report})
+
+    async def _sample(self):
+        while True:
+            await asyncio.sleep(self.sample_interval)
+            self._rss_peak = max(self._rss_peak, self._process.memory_info().rss)
+
+    def _report_retained(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        previous, self._previous_snapshot = self._previous_snapshot, snapshot
+        if previous is None:
+            return
+        growth = [stat for stat in snapshot.compare_to(previous, "traceback") if stat.size_diff > 0][:self.top]
+        if not growth:
+            return
+        lines = [f"Memory retained since the previous job started (top {len(growth)} sites):"]
+        for stat in growth:
+            frame = stat.traceback[-1]
+            lines.append(f"  +{stat.size_diff / 1024:.1f} KiB in {stat.count_diff:+d} blocks at {frame.filename}:{frame.lineno}")
+        logging.warning("\n".join(lines))
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, asdict
+
+from livekit.agents import APIError, llm
+
+# Words that usually mean the caller is giving or asking for details the
+# large model should handle (lead capture, the form, bookings, prices).
+ESCALATION_PATTERN = re.compile(
+    r"@|\d{3}|\b(email|e-mail|phone|number|name|quote|book|booking|appointment|schedule|call ?back|price|cost|"
+    r"change|wrong|correct|form|send|submit|address|reservation)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class TurnFeatures:
+    words: int
+    questions: int
+    escalation_terms: int
+    form_displayed: bool
+    recent_tool_call: bool
+    turn: int
+
+
+@dataclass
+class RoutingThresholds:
+    # Turns with more words than this, or more than one question, go to the large model.
+    max_small_words: int = 12
+    max_small_questions: int = 1
+    # The first turns set the tone of the call, so they stay on the large model.
+    min_small_turn: int = 2
+
+
+def extract_features(chat_ctx: llm.ChatContext, form_displayed: bool) -> TurnFeatures:
+    """Cheap, local features of the turn being answered; no model call involved."""
+    last_user_text = ""
+    recent_tool_call = False
+    turn = 0
+    for item in chat_ctx.items:
+        if item.type == "message" and item.role == "user":
+            turn += 1
+            last_user_text = item.text_content or ""
+            recent_tool_call = False
+        elif item.type in ("function_call", "function_call_output"):
+            recent_tool_call = True
+    return TurnFeatures(
+        words=len(last_user_text.split()),
+        questions=last_user_text.count("?"),
+        escalation_terms=len(ESCALATION_PATTERN.findall(last_user_text)),
+        form_displayed=form_displayed,
+        recent_tool_call=recent_tool_call,
+        turn=turn,
+    )
+
+
+def classify_turn(features: TurnFeatures, thresholds: RoutingThresholds) -> tuple[str, str]:
+    """Returns ("small" | "large", reason). Kept pure so logged features can be replayed offline."""
+    if features.form_displayed:
+        return "large", "form displayed"
+    if features.recent_tool_call:
+        return "large", "tool call in progress"
+    if features.escalation_terms:
+        return "large", "likely tool call"
+    if features.turn < thresholds.min_small_turn:
+        return "large", "opening turn"
+    if features.words > thresholds.max_small_words or features.questions > thresholds.max_small_questions:
+        return "large", "long or complex turn"
+    return "small", "simple turn"
+
+
+class LLMRouter:
+    def __init__(
+        self,
+        small: llm.LLM,
+        large: llm.LLM,
+        first_token_timeout: float = 1.5,
+        thresholds: RoutingThresholds | None = None,
+        decision_log: logging.Logger | None = None,
+    ):
+        """
+        Sends simple turns (acknowledgements, small talk) to a small, fast model
+        and everything else to the large one. If the chosen model has not
+        produced a first token within `first_token_timeout` seconds, or fails
+        before it, the turn is retried on the other model.
+
+        Every decision is kept with its features and latencies, and logged as
+        a JSON line to `decision_log` if given (see logs.file_logger, which
+        writes off the event loop), so thresholds can be tuned offline with
+        replay_routing.py.
+        """
+        self.models = {"small": small, "large": large}
+        self.first_token_timeout = first_token_timeout
+        self.thresholds = thresholds or RoutingThresholds()
+        self.decision_log = decision_log
+        self.decisions: list[dict] = []
+
+    async def chat(self, chat_ctx: llm.ChatContext, tools: list, tool_choice, form_displayed: bool):
+        features = extract_features(chat_ctx, form_displayed)
+        choice, reason = classify_turn(features, self.thresholds)
+        decision = {"model": choice, "reason": reason, "features": asdict(features), "fallback": False}
+        started = time.perf_counter()
+
+        for attempt, model_key in enumerate((choice, "small" if choice == "large" else "large")):
+            model = self.models[model_key]
+            model_started = time.perf_counter()
+            try:
+                async with model.chat(chat_ctx=chat_ctx, tools=tools, tool_choice=tool_choice) as stream:
+                    # Only the first token is awaited under the timeout; once the
+                    # reply has started streaming there is no switching models.
+                    first_chunk = await asyncio.wait_for(anext(stream, None), self.first_token_timeout)
+                    decision["ttft_ms"] = round((time.perf_counter() - model_started) * 1000, 1)
+                    if first_chunk is not None:
+                        yield first_chunk
+                    async for chunk in stream:
+                        yield chunk
+                decision["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                self._record(decision)
+                return
+            except (asyncio.TimeoutError, APIError) as e:
+                if "ttft_ms" in decision or attempt == 1:
+                    decision["error"] = str(e) or type(e).__name__
+                    self._record(decision)
+                    raise
+                logging.warning(f"LLM {model.model} failed or timed out before its first token ({e!r}), falling back.")
+                decision.update(model=("small" if model_key == "large" else "large"), fallback=True)
+
+    def _record(self, decision: dict):
+        self.decisions.append(decision)
+        if self.decision_log is not None:
+            self.decision_log.info(json.dumps(decision))
+
+    def summary(self) -> dict:
+        """Per-model turn counts, fallbacks and median time to first token."""
+        summary = {}
+        for key in self.models:
+            turns = [d for d in self.decisions if d["model"] == key]
+            ttfts = sorted(d["ttft_ms"] for d in turns if "ttft_ms" in d)
+            summary[key] = {
+                "turns": len(turns),
+                "fallbacks": sum(d["fallback"] for d in turns),
+                "median_ttft_ms": ttfts[len(ttfts) // 2] if ttfts else None,
+            }
+        return summary
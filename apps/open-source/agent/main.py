@@ -3,28 +3,56 @@ import logging
 import os
 import aiohttp
 import json
-from string import Template
 from dotenv import load_dotenv
 
 # Load environment variables from the .env file in this directory
 load_dotenv()
 
 
+import logs
 from core_agent import BusinessAgent
+from llm_router import LLMRouter
+from answer_cache import FAQAnswerCache
+from task_supervisor import TaskRejectedError, TaskSupervisor
+from job_memory import JobMemoryProfiler
+from job_executor import job_executor_type_from_env, process_shared, shared_silero_vad
+from greeting_timer import GreetingTimer
+from low_power import LowPowerMode
+from prompt_store import PromptStore
 from livekit import agents, rtc
 from livekit.agents import JobRequest, UserStateChangedEvent
 from livekit.agents import tts
-from livekit.plugins import deepgram, groq, silero, cartesia
+from livekit.plugins import deepgram, groq, cartesia
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Configure logging: records are written by a background thread, never on the event loop
+logs.setup_logging()
 
 # Get configuration from environment variables
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 
+# Background work (lead submissions) allowed at once, and held at most, per session and per worker process
+SESSION_TASK_CONCURRENCY = 1
+SESSION_MAX_PENDING_TASKS = 4
+WORKER_TASK_CONCURRENCY = 8
+WORKER_MAX_PENDING_TASKS = 32
+# How long submissions still in progress may run once the session ends
+TASK_SHUTDOWN_TIMEOUT = 10.0
+# An early-dispatched agent joins as the token is minted, before the visitor is
+# there to hear it, so it waits this long for their audio before greeting.
+EARLY_DISPATCH_GREETING_WAIT_TIMEOUT = 60.0
+
 async def entrypoint(ctx: agents.JobContext):
     logging.info(f"Agent received job: {ctx.job.id} for room {ctx.room.name}")
+    # One monitor per job process: reports how long the event loop running the audio pipeline gets blocked.
+    if "loop_lag" not in ctx.proc.userdata:
+        ctx.proc.userdata["loop_lag"] = logs.EventLoopLagMonitor()
+        ctx.proc.userdata["loop_lag"].start()
+    # Reports this job's memory high-water mark when it ends (and, with
+    # MEMORY_PROFILING=true, what the previous job left behind).
+    ctx.proc.userdata["memory"].start_job(ctx.job.id)
+    ctx.add_shutdown_callback(ctx.proc.userdata["memory"].end_job)
     
+    greeting_timer = GreetingTimer(ctx.job.room.metadata)
     session_ended = asyncio.Event()
     greeting_allowed = asyncio.Event()
 
@@ -32,6 +60,7 @@ async def entrypoint(ctx: agents.JobContext):
     def on_track_subscribed(track: rtc.Track, publication: rtc.TrackPublication, participant: rtc.RemoteParticipant):
         if track.kind == rtc.TrackKind.KIND_AUDIO and not participant.identity.startswith("chat-to-form-agent"):
             logging.info("AGENT: User audio track subscribed. Allowing greeting.")
+            greeting_timer.mark("visitor_audio")
             greeting_allowed.set()
 
     @ctx.room.on("participant_disconnected")
@@ -40,55 +69,25 @@ async def entrypoint(ctx: agents.JobContext):
         session_ended.set()
 
     try:
-        # 1. Build the instructions from the local prompt.template and .env file
-        with open("prompt.template", "r") as f:
-            prompt_template = Template(f.read())
-        
-        # Customize instructions based on room name
-        room_name = ctx.room.name
-        if "newport" in room_name.lower():
-            # Pelican Petey's personality instructions (Newport Beach Vacation Properties)
-            instructions = (
-                f"You are Pelican Petey with Newport Beach Vacation Properties. You're calling to confirm a reservation for one of your beautiful vacation homes. The caller has already confirmed it's a good time to talk. "
-                f"IMPORTANT: Review the conversation history carefully to avoid asking questions that have already been answered. Only ask questions that haven't been addressed yet. "
-                f"Your conversation flow should cover: "
-                f"1. Ask if they can speak LOUD AND CLEARLY for recorded responses (if not already asked) "
-                f"2. Ask about their vacation group (if not already covered): How many adults (individuals over age 18)? How many children (ages 2-18)? Any infants (0-2 years old)? "
-                f"3. Confirm they are over age 26 (if not already confirmed) "
-                f"4. Ask about the nature of their stay in Newport Beach (if not already discussed) "
-                f"5. Explain there are two important emails to review (if not already explained): First email: confirmation with contract and agreement that needs E-signature and approval. Second email: guest portal access with all stay information including door code "
-                f"6. Explain the guest portal answers all questions about their stay "
-                f"7. Mention 24-48 hours before check-in they'll get a text message thread for direct communication with operations team "
-                f"8. Explain this is their after-hours communication and best way to reach their care team "
-                f"9. Thank them for choosing Newport Beach Vacation Properties "
-                f"10. Provide the Vacation Planners direct number: 949-270-1119 "
-                f"Keep responses conversational and natural. Be helpful and informative about their vacation rental experience. Ask one question at a time and wait for their response before moving to the next question."
-            )
-        elif "devin" in room_name.lower():
-            # Ashley's personality instructions (Devin's personal assistant)
-            instructions = (
-                f"You are Ashley, Devin's personal assistant, calling LinkedIn connections Devin hasn't spoken to in a while (or ever). "
-                f"Your tone is warm, casual, professional, and conversational, like chatting with an old colleague. You respect their time and make the call feel personal, avoiding any salesy vibe. "
-                f"Your primary goal is to reconnect on behalf of Devin, noting he's impressed by their LinkedIn profile or work and wants a quick 15-minute chat to catch up and share his AI system, which books appointments and fills forms with 100% accuracy. "
-                f"Your secondary goal is to gauge interest and schedule a 15-minute meeting to discuss the AI system and how it might help their work. If they're hesitant, offer the demo link (https://voicesellai.com/) as a no-pressure option. "
-                f"Do not mention or use any form-handling tools or processes, as form handling is managed elsewhere. "
-                f"IF they ask about Devin mention the AI's 100% accuracy in booking appointments and or doing customer service framing it as something Devin's excited to share that could save time in areas like sales, customer service, or SMS communication. "
-                f"Offer flexible meeting times (e.g., 'What's a good day for you?') or the demo link to keep it low-pressure. Stay confident, tailored, and focused on building trust and rapport. "
-                f"Business Information: Devin Mallonee is a Web and Software Developer that loves building fun, tricky or complex solutions to problems. He is always trying to grow his community of designers, developers, business owners and leaders."
-            )
-        else:
-            # Default instructions
-            instructions = prompt_template.substitute(
-                business_name=os.getenv("BUSINESS_NAME", "the company"),
-                knowledge_base=os.getenv("KNOWLEDGE_BASE", "No information provided.")
-            )
+        # 1. Take the prompt version that is current now; this call keeps it even if
+        # the prompt files are reloaded while it is in progress.
+        prompts = ctx.proc.userdata["prompts"].current
+        persona = prompts.for_room(ctx.room.name)
+        instructions = persona.instructions
 
         await ctx.connect()
         logging.info("Agent connected to the room.")
+        greeting_timer.room_created(ctx.room.creation_time)
 
                                                 # All model initialization and session logic is now safely inside the try block
         stt = deepgram.STT()
         llm = groq.LLM(model="llama-3.3-70b-versatile")
+        # Simple turns go to a small, faster model; the large one handles the rest.
+        llm_router = LLMRouter(
+            small=groq.LLM(model=os.getenv("LLM_SMALL_MODEL", "llama-3.1-8b-instant")),
+            large=llm,
+            decision_log=logs.file_logger("llm_routing", os.environ["LLM_ROUTING_LOG"]) if os.getenv("LLM_ROUTING_LOG") else None,
+        )
         
         # Use the pre-warmed VAD model from userdata
         vad = ctx.proc.userdata["vad"]
@@ -117,12 +116,22 @@ async def entrypoint(ctx: agents.JobContext):
                 turn_detection="vad",  # Use the simpler, faster, and stable VAD-based turn detection
                 user_away_timeout=60,  # Wait for 60 seconds of silence before ending
             )
-        agent = BusinessAgent(instructions=instructions)
+        # Cached answers are kept per persona and dropped when the prompts are reloaded.
+        answer_cache = ctx.proc.userdata["answer_cache"].scope(persona.identity, str(prompts.version))
+        agent = BusinessAgent(instructions=instructions, llm_router=llm_router, answer_cache=answer_cache)
+        low_power = LowPowerMode(session, ctx.room)
+        tasks = TaskSupervisor(
+            f"session {ctx.room.name}",
+            max_concurrency=SESSION_TASK_CONCURRENCY,
+            max_pending=SESSION_MAX_PENDING_TASKS,
+            parent=ctx.proc.userdata["tasks"],
+        )
 
         @session.on("user_state_changed")
         def on_user_state_changed(ev: UserStateChangedEvent):
             if ev.new_state == "away" and agent._is_form_displayed:
                 logging.info("User is viewing the form, ignoring away state.")
+                low_power.enter("user is viewing the form")
                 return
             if ev.new_state == "away":
                 logging.info("User is away and no form is displayed, closing session.")
@@ -130,7 +139,8 @@ async def entrypoint(ctx: agents.JobContext):
 
         async def submit_lead_form_handler(data: rtc.RpcInvocationData):
             session.interrupt()
-            logging.info(f"Agent received submit_lead_form RPC with payload: {data.payload}")
+            low_power.exit("lead form submitted")
+            logging.info("Agent received submit_lead_form RPC with payload: %s", data.payload, extra=logs.SAMPLED)
 
             async def _process_submission():
                 if not WEBHOOK_URL:
@@ -158,39 +168,40 @@ async def entrypoint(ctx: agents.JobContext):
                     logging.error(f"Error processing submit_lead_form RPC for webhook: {e}")
                     await session.say("I'm sorry, a technical error occurred.")
 
-            asyncio.create_task(_process_submission())
+            try:
+                tasks.submit(_process_submission, "submit_lead_form")
+            except TaskRejectedError as e:
+                logging.warning(f"Rejecting submit_lead_form RPC: {e}")
+                raise rtc.RpcError(rtc.RpcError.ErrorCode.APPLICATION_ERROR, "Too many submissions in progress. Please try again.")
             return "SUCCESS"
 
         await session.start(room=ctx.room, agent=agent)
         ctx.room.local_participant.register_rpc_method("submit_lead_form", submit_lead_form_handler)
-        
-        # Start talking immediately without waiting for user audio track
-        room_name = ctx.room.name
-        
-        # Log which agent identity we're using
-        if "newport" in room_name.lower():
-            logging.info("Agent running as newport-voice-assistant")
-            logging.info("Using Pelican Petey's personality for this session")
-            if tts is not None:
-                await session.say(f"Hi there! This is Pelican Petey with Newport Beach Vacation Properties. I'm calling to confirm your reservation for one of our beautiful vacation homes. Is this a good time to talk?", allow_interruptions=True)
-            else:
-                logging.error("Cannot speak - TTS is not available")
-        elif "devin" in room_name.lower():
-            logging.info("Agent running as devin-voice-sell-agent")
-            logging.info("Using Ashley's personality for this session")
-            if tts is not None:
-                await session.say(f"Hi! This is Ashley, Devin's assistant. Devin's been following your work on LinkedIn and thought it'd be great to reconnect. You free to talk?", allow_interruptions=True)
-            else:
-                logging.error("Cannot speak - TTS is not available")
-        else:
-            logging.info("Agent running as voice-sell-agent")
-            logging.info("Using default personality for this session")
-            if tts is not None:
-                await session.say(f"Thank you for calling Voice Sell AI. How can I help you today?", allow_interruptions=True)
-            else:
-                logging.error("Cannot speak - TTS is not available")
+        greeting_timer.mark("agent_ready")
+
+        if greeting_timer.early_dispatch:
+            try:
+                await asyncio.wait_for(greeting_allowed.wait(), timeout=EARLY_DISPATCH_GREETING_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                logging.warning("AGENT: Timed out waiting for user audio track. Not sending greeting.")
+                session_ended.set()
+
+        # Otherwise start talking immediately without waiting for user audio track
+        logging.info(f"Agent running as {persona.identity}")
+        logging.info(f"Using {persona.name} personality for this session (prompt version {prompts.version})")
+        if tts is None:
+            logging.error("Cannot speak - TTS is not available")
+        elif not session_ended.is_set():
+            greeting_timer.mark("greeting")
+            await session.say(persona.greeting, allow_interruptions=True)
+        greeting_timer.report()
 
         await session_ended.wait()
+        low_power.close()
+        # Let submissions in progress finish (they may still speak) before closing the session.
+        await tasks.aclose(timeout=TASK_SHUTDOWN_TIMEOUT)
+        logging.info(f"Background tasks for this session: {tasks.metrics()}, worker: {ctx.proc.userdata['tasks'].metrics()}")
+        logging.info(f"LLM routing for this session: {llm_router.summary()}")
         await session.aclose()
 
     except Exception as e:
@@ -205,13 +216,22 @@ async def request_fnc(req: JobRequest):
     logging.info(f"Accepting job {req.job.id} for room {req.job.room}")
     await req.accept(identity="voice-sell-agent")
 
+def _watched_prompt_store() -> PromptStore:
+    prompts = PromptStore()
+    prompts.start_watching()
+    return prompts
+
 def prewarm(proc: agents.JobProcess):
     # This function is called once when a new job process starts.
     # We load environment variables and our stable, local VAD model here.
     load_dotenv()
     logging.info("Prewarm: Environment variables loaded into child process.")
     
-    proc.userdata["vad"] = silero.VAD.load()
+    # With AGENT_EXECUTOR=thread, prewarm runs for every job thread: the VAD
+    # model, the answer cache and the prompts are loaded once per process and
+    # shared, while the TTS client and the task supervisor belong to the job's
+    # event loop.
+    proc.userdata["vad"] = shared_silero_vad()
     logging.info("Prewarm complete: VAD model loaded.")
     
     # Initialize TTS configuration with error handling
@@ -224,6 +244,22 @@ def prewarm(proc: agents.JobProcess):
         logging.warning("TTS will not be available - agent will not be able to speak")
         proc.userdata["tts_default"] = None
 
+    # Per-job memory accounting; tracemalloc only runs with MEMORY_PROFILING=true.
+    # With the thread executor its figures cover every job in the process.
+    proc.userdata["memory"] = JobMemoryProfiler()
+
+    # Bounds the background work of all sessions this process (or job thread) runs.
+    proc.userdata["tasks"] = TaskSupervisor("worker", max_concurrency=WORKER_TASK_CONCURRENCY, max_pending=WORKER_MAX_PENDING_TASKS)
+
+    # Shared by every session this process runs, so repeat questions skip the LLM.
+    proc.userdata["answer_cache"] = process_shared(
+        "answer_cache", lambda: FAQAnswerCache(ttl=float(os.getenv("FAQ_CACHE_TTL_SECONDS", "3600")))
+    )
+
+    # Prompts and personas are compiled once per process and hot-reloaded on change.
+    proc.userdata["prompts"] = process_shared("prompts", _watched_prompt_store)
+    logging.info("Prewarm complete: prompts loaded and watched for changes.")
+
 if __name__ == "__main__":
     logging.info("Starting InputRight (Open Source) Agent Worker...")
     
@@ -245,7 +281,11 @@ if __name__ == "__main__":
         agents.WorkerOptions(
             request_fnc=request_fnc,
             entrypoint_fnc=entrypoint,
-            prewarm_fnc=prewarm
+            prewarm_fnc=prewarm,
+            # AGENT_EXECUTOR=thread hosts many sessions per process (see job_executor.py)
+            job_executor_type=job_executor_type_from_env(),
+            # With a name, the worker only takes explicitly dispatched jobs (see EARLY_AGENT_DISPATCH)
+            agent_name=os.getenv("AGENT_NAME", ""),
         )
     )
 
@@ -0,0 +1,112 @@
+import logging
+import json
+import os
+import threading
+from dataclasses import dataclass
+from string import Template
+
+from dotenv import dotenv_values
+from watchfiles import watch
+
+PROMPT_TEMPLATE_PATH = "prompt.template"
+PERSONAS_PATH = "personas.json"
+ENV_PATH = ".env"
+
+
+@dataclass(frozen=True)
+class Persona:
+    identity: str
+    name: str
+    instructions: str
+    greeting: str
+
+
+@dataclass(frozen=True)
+class PromptSet:
+    """One validated version of the default prompt and the personas. Never modified once built."""
+    version: int
+    default: Persona
+    personas: dict[str, Persona]
+
+    def for_room(self, room_name: str) -> Persona:
+        """Personas are picked by a keyword in the room name, e.g. "newport_..."."""
+        for keyword, persona in self.personas.items():
+            if keyword in room_name.lower():
+                return persona
+        return self.default
+
+
+def build_prompt_set(version: int) -> PromptSet:
+    """
+    Reads and validates prompt.template, personas.json and the business settings.
+    Raises if anything is missing or malformed, so a bad edit never reaches a call.
+    """
+    # Values in .env win over the process environment, which still holds the
+    # values load_dotenv copied from .env when the worker started.
+    env = {**os.environ, **{k: v for k, v in dotenv_values(ENV_PATH).items() if v is not None}}
+
+    with open(PROMPT_TEMPLATE_PATH, "r") as f:
+        template = Template(f.read())
+    default_instructions = template.substitute(
+        business_name=env.get("BUSINESS_NAME", "the company"),
+        knowledge_base=env.get("KNOWLEDGE_BASE", "No information provided."),
+    )
+
+    with open(PERSONAS_PATH, "r") as f:
+        config = json.load(f)
+    default = Persona(instructions=default_instructions, **config["default"])
+    personas = {keyword.lower(): Persona(**fields) for keyword, fields in config["personas"].items()}
+    for persona in (default, *personas.values()):
+        if not persona.instructions.strip() or not persona.greeting.strip():
+            raise ValueError(f"Persona '{persona.name}' needs non-empty instructions and greeting.")
+
+    return PromptSet(version=version, default=default, personas=personas)
+
+
+class PromptStore:
+    def __init__(self):
+        """
+        Holds the current PromptSet and rebuilds it whenever prompt.template,
+        personas.json or .env change, without restarting the worker.
+        Sessions read `current` once when they start and keep that version for
+        the whole call; a new version only affects sessions started after it.
+        """
+        self._current = build_prompt_set(version=1)
+        self._stop = threading.Event()
+        self._watcher = None
+
+    @property
+    def current(self) -> PromptSet:
+        return self._current
+
+    def reload(self):
+        try:
+            prompt_set = build_prompt_set(version=self._current.version + 1)
+        except Exception as e:
+            logging.error(f"Prompt reload rejected, keeping version {self._current.version}: {e}")
+            return
+        # Swapping a single reference is atomic, so a session never sees a half-built set.
+        self._current = prompt_set
+        logging.info(f"Prompts reloaded, now at version {prompt_set.version}.")
+
+    def start_watching(self):
+        """Watches the files from a daemon thread (inotify on Linux)."""
+        self._watcher = threading.Thread(target=self._watch, name="prompt-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self):
+        # Watch the directory rather than the files: editors and deploys often
+        # replace a file by renaming a new one over it, which a watch on the old
+        # file would miss.
+        watched = {os.path.abspath(path) for path in (PROMPT_TEMPLATE_PATH, PERSONAS_PATH, ENV_PATH)}
+        for changes in watch(
+            ".",
+            watch_filter=lambda change, path: os.path.abspath(path) in watched,
+            recursive=False,
+            stop_event=self._stop,
+        ):
+            logging.info(f"Prompt files changed: {sorted({os.path.basename(path) for _, path in changes})}")
+            self.reload()
@@ -0,0 +1,91 @@
+"""
+Replays logged LLM routing decisions (LLM_ROUTING_LOG, one JSON object per
+line) through classify_turn with other thresholds, to tune them offline.
+
+For each combination of thresholds it reports:
+  * how many turns would go to the small model, and how many turns change model,
+  * "small misses": turns it sends to the small model that the logged run also
+    tried there first and then had to retry on the large model, or that
+    failed there; a good setting keeps these near zero,
+  * the expected median time to first token, from the latencies logged for
+    each model on turns answered without a fallback.
+
+Run with any of the thresholds as comma-separated values to compare them:
+    python replay_routing.py routing.jsonl --max-small-words 8,12,16 --min-small-turn 1,2
+"""
+import argparse
+import dataclasses
+import itertools
+import json
+
+from llm_router import RoutingThresholds, TurnFeatures, classify_turn
+
+
+def load_decisions(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def first_choice(decision: dict) -> str:
+    """The model the logged run tried first: after a fallback, `model` is the other one."""
+    if not decision["fallback"]:
+        return decision["model"]
+    return "small" if decision["model"] == "large" else "large"
+
+
+def _median(values: list[float]) -> float | None:
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+
+def replay(decisions: list[dict], thresholds: RoutingThresholds) -> dict:
+    ttfts = {
+        key: _median([d["ttft_ms"] for d in decisions if d["model"] == key and not d["fallback"] and "ttft_ms" in d])
+        for key in ("small", "large")
+    }
+    small = changed = misses = 0
+    expected_ttfts = []
+    for decision in decisions:
+        choice, _ = classify_turn(TurnFeatures(**decision["features"]), thresholds)
+        small += choice == "small"
+        changed += choice != first_choice(decision)
+        if choice == "small" and first_choice(decision) == "small" and (decision["fallback"] or "error" in decision):
+            misses += 1
+        if ttfts[choice] is not None:
+            expected_ttfts.append(ttfts[choice])
+    return {
+        **dataclasses.asdict(thresholds),
+        "turns": len(decisions),
+        "small": small,
+        "changed": changed,
+        "small_misses": misses,
+        "median_ttft_ms": round(_median(expected_ttfts), 1) if expected_ttfts else None,
+    }
+
+
+def main(args):
+    decisions = load_decisions(args.decision_log)
+    grid = [dict(zip(args.thresholds, values)) for values in itertools.product(*args.thresholds.values())]
+    print(f"{len(decisions)} logged turns")
+    print(f"{'max words':>9} {'max q':>6} {'min turn':>8} {'small':>6} {'changed':>8} {'misses':>7} {'ttft p50':>9}")
+    for overrides in grid:
+        row = replay(decisions, RoutingThresholds(**overrides))
+        print(
+            f"{row['max_small_words']:>9} {row['max_small_questions']:>6} {row['min_small_turn']:>8} "
+            f"{row['small']:>6} {row['changed']:>8} {row['small_misses']:>7} {row['median_ttft_ms'] or '-':>9}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("decision_log", help="The JSONL file written through LLM_ROUTING_LOG.")
+    defaults = RoutingThresholds()
+    for field in dataclasses.fields(RoutingThresholds):
+        parser.add_argument(
+            f"--{field.name.replace('_', '-')}", dest=field.name, default=[getattr(defaults, field.name)],
+            type=lambda value: [int(n) for n in value.split(",")],
+            help=f"Comma-separated values to try (default {getattr(defaults, field.name)}).",
+        )
+    parsed = parser.parse_args()
+    parsed.thresholds = {field.name: getattr(parsed, field.name) for field in dataclasses.fields(RoutingThresholds)}
+    main(parsed)
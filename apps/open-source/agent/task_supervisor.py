@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import logging
+from typing import Awaitable, Callable
+
+
+class TaskRejectedError(Exception):
+    """The supervisor is closed or already holds as much work as it accepts."""
+
+
+class TaskSupervisor:
+    def __init__(self, name: str, max_concurrency: int, max_pending: int, parent: "TaskSupervisor | None" = None):
+        """
+        Runs background work with at most `max_concurrency` tasks at a time and at
+        most `max_pending` tasks held (queued or running); past that, submit()
+        raises TaskRejectedError so callers can push back instead of piling up work.
+
+        A session's supervisor takes the worker's supervisor as `parent`: its tasks
+        then also need one of the worker's slots, which bounds the work of all
+        sessions in the process together.
+        """
+        self.name = name
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._max_pending = max_pending
+        self._parent = parent
+        # Strong references, so running tasks are never garbage-collected
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+        self._queued = 0
+        self._running = 0
+        self._counts = {"completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+
+    def submit(self, coro_fn: Callable[[], Awaitable], name: str) -> asyncio.Task:
+        """Schedules `coro_fn()`. Failures are logged and counted, never raised to the caller."""
+        supervisors = [self] if self._parent is None else [self, self._parent]
+        for supervisor in supervisors:
+            if supervisor._closed or supervisor._queued + supervisor._running >= supervisor._max_pending:
+                for rejecting in {self, supervisor}:
+                    rejecting._counts["rejected"] += 1
+                raise TaskRejectedError(f"{supervisor.name} is not accepting more tasks ({supervisor.metrics()}).")
+
+        for supervisor in supervisors:
+            supervisor._queued += 1
+        task = asyncio.create_task(self._run(coro_fn, name, supervisors), name=f"{self.name}:{name}")
+        for supervisor in supervisors:
+            supervisor._tasks.add(task)
+            task.add_done_callback(supervisor._tasks.discard)
+        return task
+
+    async def _run(self, coro_fn, name: str, supervisors: list["TaskSupervisor"]):
+        started = False
+        outcome = "cancelled"
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                # Take the session's slot before the worker's, so a session waiting on
+                # its own limit never holds a slot other sessions could use.
+                for supervisor in supervisors:
+                    await stack.enter_async_context(supervisor._slots)
+                for supervisor in supervisors:
+                    supervisor._queued -= 1
+                    supervisor._running += 1
+                started = True
+                try:
+                    await coro_fn()
+                finally:
+                    for supervisor in supervisors:
+                        supervisor._running -= 1
+            outcome = "completed"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            outcome = "failed"
+            logging.error(f"Background task {name} in {self.name} failed: {e}", exc_info=True)
+        finally:
+            for supervisor in supervisors:
+                if not started:
+                    supervisor._queued -= 1
+                supervisor._counts[outcome] += 1
+
+    async def aclose(self, timeout: float = 5.0):
+        """
+        Stops accepting tasks and gives the ones already submitted until `timeout`
+        to finish; whatever is left is then cancelled and awaited.
+        """
+        self._closed = True
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if pending:
+            logging.warning(f"Cancelling {len(pending)} background tasks of {self.name} still running after {timeout}s.")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def metrics(self) -> dict[str, int]:
+        return {"queued": self._queued, "running": self._running, **self._counts}
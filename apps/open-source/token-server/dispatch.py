@@ -0,0 +1,99 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+
+import aiohttp
+from livekit import api
+
+# Without a visitor joining, an early-created room closes after this many seconds.
+ROOM_EMPTY_TIMEOUT = 120
+DISPATCH_TIMEOUT = aiohttp.ClientTimeout(total=3)
+# Workers started with AGENT_NAME only take jobs explicitly dispatched to that name.
+AGENT_NAME = os.getenv("AGENT_NAME", "")
+# An early-dispatched agent waits this long for its visitor (the agent's
+# EARLY_DISPATCH_GREETING_WAIT_TIMEOUT), holding a job even if nobody comes.
+EARLY_DISPATCH_PENDING_SECONDS = 60
+# Rooms dispatched early within the last EARLY_DISPATCH_PENDING_SECONDS, per
+# process, beyond which tokens fall back to dispatch on join.
+EARLY_DISPATCH_MAX_PENDING = int(os.getenv("EARLY_DISPATCH_MAX_PENDING", "50"))
+
+
+def agent_dispatch_config() -> api.RoomConfiguration | None:
+    """
+    Room configuration for the visitor's token: with AGENT_NAME set, it
+    dispatches that agent when the visitor joining creates the room (early
+    dispatch off, failed or capped). A room created early keeps its own dispatch.
+    """
+    if not AGENT_NAME:
+        return None
+    return api.RoomConfiguration(agents=[api.RoomAgentDispatch(agent_name=AGENT_NAME)])
+
+
+class EarlyDispatcher:
+    def __init__(
+        self, url: str, api_key: str, api_secret: str, agent_name: str = "",
+        max_pending: int = EARLY_DISPATCH_MAX_PENDING,
+    ):
+        """
+        Creates the visitor's room when their token is minted, so an agent is
+        dispatched and warmed up before the visitor even connects. The room's
+        metadata carries the business_id and the dispatch time.
+
+        Workers registered without an agent name are dispatched automatically
+        when the room is created. With `agent_name` (workers started with the
+        same AGENT_NAME), the room is created with an explicit dispatch instead.
+
+        Every early-created room holds an agent job until its visitor arrives
+        or the agent gives up waiting, so at most `max_pending` rooms are
+        dispatched early per EARLY_DISPATCH_PENDING_SECONDS; tokens minted
+        beyond that get their agent when the visitor joins.
+        """
+        self._url = url
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self._agent_name = agent_name
+        self._api = None
+        self._max_pending = max_pending
+        # Monotonic times of the recent early dispatches, oldest first
+        self._pending: deque[float] = deque()
+
+    async def prepare_room(self, room_name: str, business_id: str) -> bool:
+        """Returns False if the room was not created; the agent is then dispatched when the visitor joins."""
+        now = time.monotonic()
+        while self._pending and now - self._pending[0] > EARLY_DISPATCH_PENDING_SECONDS:
+            self._pending.popleft()
+        if len(self._pending) >= self._max_pending:
+            logging.warning("%s early-dispatched rooms pending, dispatching room %s on join", len(self._pending), room_name)
+            return False
+        if self._api is None:
+            # Created on first use, inside the running event loop its HTTP session needs.
+            self._api = api.LiveKitAPI(self._url, self._api_key, self._api_secret, timeout=DISPATCH_TIMEOUT)
+        metadata = json.dumps({"business_id": business_id, "dispatched_at": time.time()})
+        request = api.CreateRoomRequest(name=room_name, empty_timeout=ROOM_EMPTY_TIMEOUT, metadata=metadata)
+        if self._agent_name:
+            request.agents.append(api.RoomAgentDispatch(agent_name=self._agent_name, metadata=metadata))
+        try:
+            await self._api.room.create_room(request)
+        except (api.TwirpError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning("Early agent dispatch for room %s failed, falling back to dispatch on join: %s", room_name, e)
+            return False
+        self._pending.append(now)
+        return True
+
+    async def aclose(self):
+        if self._api is not None:
+            await self._api.aclose()
+
+
+def early_dispatcher_from_env() -> EarlyDispatcher | None:
+    """Enabled with EARLY_AGENT_DISPATCH=true; needs LIVEKIT_URL besides the API credentials."""
+    if os.getenv("EARLY_AGENT_DISPATCH", "false").lower() != "true":
+        return None
+    url = os.getenv("LIVEKIT_URL")
+    if not url:
+        logging.error("EARLY_AGENT_DISPATCH is enabled but LIVEKIT_URL is not set; agents will be dispatched on join.")
+        return None
+    return EarlyDispatcher(url, os.getenv("LIVEKIT_API_KEY"), os.getenv("LIVEKIT_API_SECRET"), AGENT_NAME)
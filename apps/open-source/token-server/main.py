@@ -1,5 +1,7 @@
 import os
 import uuid
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,13 +9,32 @@ from pydantic import BaseModel
 from livekit import api
 from dotenv import load_dotenv
 
+from dispatch import agent_dispatch_config, early_dispatcher_from_env
+from ratelimit import RateLimitMiddleware, rate_limit_options_from_env
+
 # Load environment variables from the .env file in the current directory
 load_dotenv()
 
 LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
 LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
+# Set when EARLY_AGENT_DISPATCH=true: rooms are created, and agents dispatched, as tokens are minted
+early_dispatcher = early_dispatcher_from_env()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if early_dispatcher is not None:
+        await early_dispatcher.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# Every token can start an agent job, so limit how fast they can be minted.
+# Added before CORS so that rejected requests still carry CORS headers.
+app.add_middleware(
+    RateLimitMiddleware,
+    paths={"/api/token"},
+    **rate_limit_options_from_env(),
+)
 
 # Configure CORS to allow requests from our frontend (running on localhost:3000 or 3001)
 app.add_middleware(
@@ -46,7 +67,15 @@ async def get_token(request: TokenRequest):
             can_publish=True,
             can_subscribe=True,
             can_publish_data=True,
-        )).to_jwt()
+        ))
+    # Named agents are only dispatched explicitly, also when the visitor's joining creates the room.
+    room_config = agent_dispatch_config()
+    if room_config is not None:
+        token = token.with_room_config(room_config)
+    token = token.to_jwt()
+
+    if early_dispatcher is not None:
+        await early_dispatcher.prepare_room(room_name, request.business_id)
 
     return {"token": token}
 
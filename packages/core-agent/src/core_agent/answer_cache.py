@@ -0,0 +1,208 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# Filler and politeness words that do not change what is being asked.
+STOPWORDS = frozenset(
+    "a an the um uh er hi hello hey so well please just can could would you your tell me i we to is are do does "
+    "of for what whats about know like and or it its this that there any some be on in at".split()
+)
+QUESTION_START = re.compile(r"^(what|when|where|which|who|how|why|do|does|are|is|can|could|will|would)\b", re.IGNORECASE)
+# Answers to turns that carry the caller's own details are personal and never shared.
+PERSONAL_DETAILS = re.compile(r"@|\d{3}|\b(my name|i'm|i am|email|phone)\b", re.IGNORECASE)
+# Answers that could carry a caller's details: emails, any digits (phone numbers,
+# addresses), read-backs of what the caller gave.
+PERSONAL_ANSWER = re.compile(
+    r"@|\d|\byour (name|e-?mail|phone|number|address)\b|\byou (said|mentioned|told|gave)\b", re.IGNORECASE
+)
+# Questions that only make sense within their call ("can you repeat that?",
+# "how much is it?") refer back to earlier turns and are never shared.
+REFERENTIAL = frozenset(
+    "repeat again that it this these those they them he she him her his one said say saying mean meant "
+    "earlier before previous last above same".split()
+)
+MAX_QUESTION_WORDS = 25
+# Content tokens a question needs to be specific enough to share
+MIN_QUESTION_TOKENS = 2
+
+
+def normalize_question(text: str) -> frozenset[str]:
+    """Lowercases, drops punctuation and filler words, and crudely singularizes the rest."""
+    tokens = re.findall(r"[a-z0-9']+", text.lower())
+    return frozenset(
+        token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+        for token in (t.replace("'", "") for t in tokens)
+        if token not in STOPWORDS
+    )
+
+
+def normalize_answer(text: str) -> str:
+    """Lowercase words only, so answers differing in punctuation or spacing compare equal."""
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+def is_cacheable_question(text: str) -> bool:
+    """Self-contained, impersonal questions only."""
+    text = text.strip()
+    return (
+        bool(text)
+        and len(text.split()) <= MAX_QUESTION_WORDS
+        and (text.endswith("?") or bool(QUESTION_START.match(text)))
+        and not PERSONAL_DETAILS.search(text)
+        and REFERENTIAL.isdisjoint(re.findall(r"[a-z]+", text.lower()))
+        and len(normalize_question(text)) >= MIN_QUESTION_TOKENS
+    )
+
+
+def caller_names(caller_turns: list[str]) -> set[str]:
+    """Capitalized words the caller used other than at the start of a sentence: likely names."""
+    names = set()
+    for turn in caller_turns:
+        for match in re.finditer(r"(?<![.!?]\s)(?<!^)\b([A-Z][a-z]{2,})\b", turn.strip()):
+            names.add(match.group(1).lower())
+    return names
+
+
+def is_shareable_answer(answer: str, caller_turns: list[str]) -> bool:
+    """
+    False when the answer may carry details of this caller. Once the caller has
+    given any details in the call, none of its answers are shared.
+    """
+    if PERSONAL_ANSWER.search(answer) or any(PERSONAL_DETAILS.search(turn) for turn in caller_turns):
+        return False
+    return caller_names(caller_turns).isdisjoint(re.findall(r"[a-z]+", answer.lower()))
+
+
+@dataclass
+class CachedAnswer:
+    tokens: frozenset[str]
+    answer: str
+    created_at: float
+    hits: int = 0
+    # Sessions in a row that got this same answer from the LLM
+    confirmations: int = 1
+
+
+class _BusinessEntries:
+    def __init__(self, profile_version: str):
+        self.profile_version = profile_version
+        self.entries: OrderedDict[frozenset[str], CachedAnswer] = OrderedDict()
+
+
+class FAQAnswerCache:
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_entries_per_business: int = 256,
+        min_confirmations: int = 2,
+    ):
+        """
+        Answers the agent already gave to common questions (hours, service area,
+        pricing), per business, keyed by the normalized question. A question
+        only matches a cached one with exactly the same content words (even one
+        added qualifier, as in "tankless water heater replacement", can change
+        the answer), and only once the LLM gave the same answer to it in
+        `min_confirmations` sessions in a row. Entries expire after `ttl`
+        seconds, and all of a business's entries are dropped when its profile
+        version changes. Safe to share between job threads (AGENT_EXECUTOR=thread).
+        """
+        self.ttl = ttl
+        self.max_entries_per_business = max_entries_per_business
+        self.min_confirmations = min_confirmations
+        self._businesses: dict[str, _BusinessEntries] = {}
+        # Held for a few dict operations only, so sessions never wait on each other for long.
+        self._lock = threading.Lock()
+
+    def scope(self, business_id: str, profile_version: str) -> "BusinessAnswerCache":
+        """
+        Called when a session starts with the business profile it loaded. A new
+        profile version drops the business's cached answers.
+        """
+        with self._lock:
+            business = self._businesses.get(business_id)
+            if business is None or business.profile_version != profile_version:
+                if business is not None:
+                    logging.info(f"Business {business_id} profile changed, dropping {len(business.entries)} cached answers.")
+                self._businesses[business_id] = _BusinessEntries(profile_version)
+        return BusinessAnswerCache(self, business_id, profile_version)
+
+    def _entries(self, business_id: str, profile_version: str) -> _BusinessEntries | None:
+        # Sessions that started on an older profile neither read nor write answers.
+        business = self._businesses.get(business_id)
+        if business is None or business.profile_version != profile_version:
+            return None
+        return business
+
+    def lookup(self, business_id: str, profile_version: str, question: str) -> str | None:
+        if not is_cacheable_question(question):
+            return None
+        tokens = normalize_question(question)
+        if not tokens:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            business = self._entries(business_id, profile_version)
+            if business is None:
+                return None
+
+            entry = business.entries.get(tokens)
+            if entry is None:
+                return None
+            if now - entry.created_at > self.ttl:
+                del business.entries[tokens]
+                return None
+            if entry.confirmations < self.min_confirmations:
+                return None
+            entry.hits += 1
+            business.entries.move_to_end(tokens)
+        logging.info("FAQ cache hit for business %s (%d hits).", business_id, entry.hits)
+        return entry.answer
+
+    def store(
+        self, business_id: str, profile_version: str, question: str, answer: str, caller_turns: list[str] = ()
+    ) -> frozenset[str] | None:
+        """Records the answer; returns its key, or None when it is not shared."""
+        answer = answer.strip()
+        if not answer or not is_cacheable_question(question) or not is_shareable_answer(answer, list(caller_turns)):
+            return None
+        tokens = normalize_question(question)
+        with self._lock:
+            business = self._entries(business_id, profile_version)
+            if business is None:
+                return None
+            previous = business.entries.pop(tokens, None)
+            # A different answer starts over: it is only served once sessions agree on it.
+            confirmations = 1
+            if previous is not None and normalize_answer(previous.answer) == normalize_answer(answer):
+                confirmations = previous.confirmations + 1
+            business.entries[tokens] = CachedAnswer(
+                tokens=tokens, answer=answer, created_at=time.monotonic(), confirmations=confirmations
+            )
+            while len(business.entries) > self.max_entries_per_business:
+                business.entries.popitem(last=False)
+        return tokens
+
+
+class BusinessAnswerCache:
+    """The cache as seen by one session: one business, at the profile version the session started with."""
+
+    def __init__(self, cache: FAQAnswerCache, business_id: str, profile_version: str):
+        self._cache = cache
+        self._business_id = business_id
+        self._profile_version = profile_version
+        # Keys this session stored: a session confirms each answer only once.
+        self._stored: set[frozenset[str]] = set()
+
+    def lookup(self, question: str) -> str | None:
+        return self._cache.lookup(self._business_id, self._profile_version, question)
+
+    def store(self, question: str, answer: str, caller_turns: list[str] = ()):
+        """`caller_turns` are everything the caller said in the call so far."""
+        if normalize_question(question) in self._stored:
+            return
+        key = self._cache.store(self._business_id, self._profile_version, question, answer, caller_turns)
+        if key is not None:
+            self._stored.add(key)
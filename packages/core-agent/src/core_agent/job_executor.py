@@ -0,0 +1,60 @@
+import dataclasses
+import os
+import threading
+from typing import Callable, TypeVar
+
+from livekit import agents
+from livekit.plugins import silero
+
+# How a worker runs its jobs, set with AGENT_EXECUTOR:
+#   process  (default) every job gets a process of its own, which runs prewarm
+#            and loads its own copy of every model.
+#   thread   jobs run as threads of one worker process, each with its own
+#            event loop. prewarm still runs for every job thread, but whatever
+#            it loads through process_shared is loaded once per process.
+# apps/cloud/agent/benchmarks/session_footprint.py measures memory, CPU and
+# turn latency per session in both modes.
+
+T = TypeVar("T")
+
+_shared: dict[str, object] = {}
+_shared_lock = threading.Lock()
+
+
+def job_executor_type_from_env() -> agents.JobExecutorType:
+    return agents.JobExecutorType(os.getenv("AGENT_EXECUTOR", "process").lower())
+
+
+def process_shared(name: str, factory: Callable[[], T]) -> T:
+    """
+    Returns the process-wide object `name`, created by `factory` on first use.
+    Only for objects that every job thread may use at once: anything bound to
+    an event loop (HTTP clients, TTS connection pools, asyncio locks) must
+    still be created per job.
+    """
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = factory()
+        return _shared[name]
+
+
+# shared_silero_vad reads private attributes of silero.VAD, which has no public
+# way to build a VAD around an already loaded model. It was checked against this
+# version, the one pinned in the requirements; check it again before upgrading.
+SILERO_PLUGIN_VERSION = "1.2.5"
+
+
+def shared_silero_vad() -> silero.VAD:
+    """
+    A Silero VAD for one job, running on the process-wide ONNX model (which
+    ONNX Runtime lets several threads run at once). The VAD object itself is
+    per job, as agent sessions subscribe to its metrics events, and call their
+    handlers on the thread that emits them.
+    """
+    if silero.__version__ != SILERO_PLUGIN_VERSION:
+        raise RuntimeError(
+            f"shared_silero_vad supports livekit-plugins-silero=={SILERO_PLUGIN_VERSION}, "
+            f"found {silero.__version__}"
+        )
+    loaded = process_shared("silero_vad", silero.VAD.load)
+    return silero.VAD(session=loaded._onnx_session, opts=dataclasses.replace(loaded._opts))
@@ -0,0 +1,57 @@
+import logging
+import time
+from livekit import agents, rtc
+
+
+class LowPowerMode:
+    def __init__(self, session: agents.AgentSession, room: rtc.Room):
+        """
+        Pauses STT streaming and VAD while the user is idle (for example, while
+        they are filling in the verification form) and resumes them as soon as
+        the user speaks again or submits the form.
+
+        Voice activity is detected from the room's active speakers, which LiveKit
+        computes server-side, so nothing runs on the worker while we are paused.
+        """
+        self._session = session
+        self._room = room
+        self._paused_at: float | None = None
+        # Total time STT and VAD were paused during this session
+        self.stt_seconds_saved = 0.0
+        room.on("active_speakers_changed", self._on_active_speakers_changed)
+
+    @property
+    def active(self) -> bool:
+        return self._paused_at is not None
+
+    def enter(self, reason: str):
+        """Stops forwarding the user's audio to STT and VAD."""
+        if self.active:
+            return
+        self._session.input.set_audio_enabled(False)
+        self._paused_at = time.monotonic()
+        logging.info(f"Entering low-power mode ({reason}): STT streaming and VAD paused.")
+
+    def exit(self, reason: str):
+        """Resumes STT streaming and VAD immediately."""
+        if not self.active:
+            return
+        self._session.input.set_audio_enabled(True)
+        paused_for = time.monotonic() - self._paused_at
+        self._paused_at = None
+        self.stt_seconds_saved += paused_for
+        logging.info(f"Leaving low-power mode ({reason}) after {paused_for:.1f}s.")
+
+    def close(self) -> float:
+        """Resumes audio if needed, reports the STT time saved and returns it in seconds."""
+        self.exit("session closing")
+        self._room.off("active_speakers_changed", self._on_active_speakers_changed)
+        logging.info(f"Low-power mode saved {self.stt_seconds_saved:.1f}s of STT streaming this session.")
+        return self.stt_seconds_saved
+
+    def _on_active_speakers_changed(self, speakers: list[rtc.Participant]):
+        if not self.active:
+            return
+        local_identity = self._room.local_participant.identity
+        if any(speaker.identity != local_identity for speaker in speakers):
+            self.exit("voice activity detected")